@@ -10,7 +10,8 @@ More information on Swagger can be found `on the Swagger website
 <https://developers.helloreverb.com/swagger/>`
 """
 
-__all__ = ["client", "codegen", "processors", "swagger_model"]
+__all__ = ["batch", "cache", "client", "codec", "codegen", "events",
+           "metrics", "models", "processors", "snapshot", "swagger_model"]
 
 from .swagger_model import load_file, load_json, load_url, Loader
 from .processors import SwaggerProcessor, SwaggerError
@@ -0,0 +1,277 @@
+#!/usr/bin/env python
+
+#
+# Copyright (c) 2018, Matthias Urlichs
+#
+
+"""Running many operations concurrently.
+
+A Batch runs the operations submitted to it in a task group and yields
+their results as they complete::
+
+    async with client.batch(limit=20, per_host=5) as batch:
+        for channel in channels:
+            batch.submit(client.channels.hangup, channelId=channel)
+        async for result in batch:
+            if result.error is not None:
+                log.warning("%r failed: %r", result.kwargs, result.error)
+
+The operations share their client's HTTP connection pool, so
+SwaggerClient.batch() caps limit at the pool's maximum number of
+connections.
+
+Calls to different hosts share the limit fairly: whenever a slot frees
+up, it goes to the next host in turn that has calls waiting, so a host
+with hundreds of queued calls doesn't hold up the others.
+"""
+
+import collections
+import math
+import time
+import urllib.parse
+
+import anyio
+
+
+class BatchResult(object):
+    """The outcome of one operation of a Batch.
+
+    :param operation: The operation called.
+    :param kwargs: Its arguments.
+    """
+
+    __slots__ = ('operation', 'kwargs', 'value', 'error', 'elapsed')
+
+    def __init__(self, operation, kwargs):
+        self.operation = operation
+        self.kwargs = kwargs
+        #: The operation's return value.
+        self.value = None
+        #: The exception raised by the operation, if any.
+        self.error = None
+        #: Time taken by the call in seconds, excluding queueing.
+        self.elapsed = None
+
+    def __repr__(self):
+        return "%s(%s, %s)" % (
+            self.__class__.__name__, self.operation.nickname,
+            "error=%r" % (self.error,) if self.error is not None else "ok")
+
+    def result(self):
+        """Returns the operation's value, or raises its error."""
+        if self.error is not None:
+            raise self.error
+        return self.value
+
+
+class FairLimiter(object):
+    """A capacity limiter that serves hosts round-robin.
+
+    Calls waiting for a slot queue under their host. A slot that frees
+    up goes to the first waiting call of the next host in turn; within
+    a host, calls are served in order.
+
+    :param total: Number of slots.
+    """
+
+    def __init__(self, total):
+        self.total = total
+        self.free = total
+        self.queues = collections.OrderedDict()
+
+    def __repr__(self):
+        return "%s(%d/%d)" % (self.__class__.__name__, self.free, self.total)
+
+    async def acquire(self, host):
+        """Wait for a slot.
+
+        :param host: Host the call goes to.
+        """
+        if self.free and not self.queues:
+            self.free -= 1
+            return
+        granted = anyio.Event()
+        self.queues.setdefault(host, collections.deque()).append(granted)
+        try:
+            await granted.wait()
+        except BaseException:
+            if granted.is_set():
+                # We got the slot, but can't use it.
+                self.release()
+            else:
+                queue = self.queues[host]
+                queue.remove(granted)
+                if not queue:
+                    del self.queues[host]
+            raise
+
+    def release(self):
+        """Return a slot, handing it to the next host in turn."""
+        if not self.queues:
+            self.free += 1
+            return
+        host, queue = next(iter(self.queues.items()))
+        granted = queue.popleft()
+        # Move the host to the end of the line.
+        del self.queues[host]
+        if queue:
+            self.queues[host] = queue
+        granted.set()
+
+
+class Batch(object):
+    """Runs operations concurrently, yielding results as they complete.
+
+    Results are yielded by iterating over the batch; iteration ends when
+    every operation submitted so far has completed. Operations may be
+    submitted while iterating. Leaving the context waits for operations
+    whose results were not read.
+
+    :param limit: Maximum number of concurrent calls. Free slots go to
+                  the waiting hosts in turn, see FairLimiter.
+    :param per_host: Maximum number of concurrent calls to one host, on
+                     top of that. None means no limit per host.
+    :param fail_fast: Cancel the remaining operations on the first
+                      error. May be a function deciding which errors are
+                      fatal.
+    :type  fail_fast: bool or callable
+    """
+
+    def __init__(self, limit=10, per_host=None, fail_fast=False):
+        self.limit = FairLimiter(limit)
+        self.per_host = per_host
+        self.host_limits = {}
+        self.fail_fast = fail_fast
+        self.outstanding = 0
+        self.failed = None
+        self.scopes = set()
+        self.started = None
+        self.count = 0
+        self.errors = 0
+        self.cancelled = 0
+        self.busy_time = 0.0
+        self.max_elapsed = 0.0
+        self._tg = None
+
+    def __repr__(self):
+        return "%s(%d outstanding)" % (self.__class__.__name__,
+                                       self.outstanding)
+
+    async def __aenter__(self):
+        self._send, self._receive = \
+            anyio.create_memory_object_stream(math.inf)
+        self.started = time.monotonic()
+        self._tg = anyio.create_task_group()
+        await self._tg.__aenter__()
+        return self
+
+    async def __aexit__(self, *exc):
+        try:
+            return await self._tg.__aexit__(*exc)
+        finally:
+            self._tg = None
+            self._send.close()
+            self._receive.close()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        while self.outstanding:
+            result = await self._receive.receive()
+            self.outstanding -= 1
+            if result is not None:
+                return result
+        raise StopAsyncIteration
+
+    def submit(self, operation, **kwargs):
+        """Queue an operation.
+
+        :param operation: Operation to call.
+        :type  operation: client.Operation
+        :param kwargs: Its arguments.
+        """
+        if self._tg is None:
+            raise RuntimeError("%r is not running" % (self,))
+        self.outstanding += 1
+        self._tg.start_soon(self._run, operation, kwargs)
+
+    def _host_limit(self, host):
+        """Returns the limiter of a host."""
+        try:
+            return self.host_limits[host]
+        except KeyError:
+            limiter = anyio.CapacityLimiter(self.per_host)
+            self.host_limits[host] = limiter
+            return limiter
+
+    async def _run(self, operation, kwargs):
+        """Run one operation and queue its result.
+
+        Exactly one item is queued per operation; None if it was
+        cancelled.
+        """
+        result = BatchResult(operation, kwargs)
+        scope = anyio.CancelScope()
+        if self.failed is not None:
+            scope.cancel()
+        self.scopes.add(scope)
+        try:
+            with scope:
+                host = urllib.parse.urlsplit(operation.uri).netloc
+                if self.per_host is None:
+                    await self._call_fairly(result, host)
+                else:
+                    async with self._host_limit(host):
+                        await self._call_fairly(result, host)
+        finally:
+            self.scopes.discard(scope)
+        if result.elapsed is None:
+            self.cancelled += 1
+            result = None
+        self._send.send_nowait(result)
+
+    async def _call_fairly(self, result, host):
+        """Call an operation once its host's turn has come."""
+        await self.limit.acquire(host)
+        try:
+            await self._call(result)
+        finally:
+            self.limit.release()
+
+    async def _call(self, result):
+        started = time.monotonic()
+        try:
+            result.value = await result.operation(**result.kwargs)
+        except Exception as exc:
+            result.error = exc
+            self.errors += 1
+            if self.fail_fast and self.failed is None and \
+                    (self.fail_fast is True or self.fail_fast(exc)):
+                self.failed = exc
+                for scope in self.scopes:
+                    scope.cancel()
+        result.elapsed = elapsed = time.monotonic() - started
+        self.count += 1
+        self.busy_time += elapsed
+        if elapsed > self.max_elapsed:
+            self.max_elapsed = elapsed
+
+    @property
+    def stats(self):
+        """Aggregated timing of the completed operations.
+
+        :return: dict with the number of completed, failed and cancelled
+                 operations, the wall-clock time since the batch
+                 started, and the mean and maximum time per call.
+        """
+        return {
+            'completed': self.count,
+            'failed': self.errors,
+            'cancelled': self.cancelled,
+            'outstanding': self.outstanding,
+            'wall_time': time.monotonic() - self.started
+            if self.started is not None else 0.0,
+            'mean_time': self.busy_time / self.count if self.count else 0.0,
+            'max_time': self.max_elapsed,
+        }
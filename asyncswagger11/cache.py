@@ -0,0 +1,107 @@
+#
+# Copyright (c) 2018, Matthias Urlichs
+#
+
+"""Caches for processed Swagger API models.
+
+A cache stores the fully processed resource listing, together with the
+validators (ETag, Last-Modified, file mtime) of every document it was
+built from, so that a Loader can revalidate it with conditional requests
+instead of downloading and processing the whole API again.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+
+
+class SpecCache(object):
+    """Interface for a cache of processed resource listings.
+
+    Entries are plain JSON-compatible dicts, keyed by the URL of the
+    resource listing.
+    """
+
+    #: get() and put() block, e.g. on file I/O: the Loader calls them
+    #: in a worker thread.
+    blocking = False
+
+    def get(self, url):
+        """Look up a cache entry.
+
+        :param url: URL of the resource listing.
+        :return: The cached entry, or None if not found.
+        """
+        raise NotImplementedError(
+            "%s: Method not implemented", self.__class__.__name__)
+
+    def put(self, url, entry):
+        """Store a cache entry.
+
+        :param url: URL of the resource listing.
+        :param entry: Entry to store.
+        :type  entry: dict
+        """
+        raise NotImplementedError(
+            "%s: Method not implemented", self.__class__.__name__)
+
+
+class MemorySpecCache(SpecCache):
+    """In-process cache.
+
+    Entries are shared, not copied; don't modify them.
+    """
+
+    def __init__(self):
+        self.entries = {}
+
+    def get(self, url):
+        return self.entries.get(url)
+
+    def put(self, url, entry):
+        self.entries[url] = entry
+
+
+class FileSpecCache(SpecCache):
+    """On-disk cache, one JSON file per resource listing URL.
+
+    Files are replaced atomically, so several processes may share the
+    same directory.
+
+    :param directory: Directory to store cache files in.
+    """
+
+    blocking = True
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def __repr__(self):
+        return "%s(%s)" % (self.__class__.__name__, self.directory)
+
+    def path(self, url):
+        """Returns the name of the file caching a URL.
+
+        :param url: URL of the resource listing.
+        """
+        name = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, name + ".json")
+
+    def get(self, url):
+        try:
+            with open(self.path(url), "r") as fp:
+                return json.load(fp)
+        except (OSError, ValueError):
+            return None
+
+    def put(self, url, entry):
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as fp:
+                json.dump(entry, fp)
+            os.replace(tmp, self.path(url))
+        except BaseException:
+            os.unlink(tmp)
+            raise
@@ -8,15 +8,23 @@
    rewritten with use of anyio libs
 """
 
-import json
+import collections.abc
 import logging
 import os.path
 import re
-import urllib
+import time
+import types
+import urllib.parse
+import urllib.request
+import anyio
 import asyncswagger11
 
+from asyncswagger11.batch import Batch
 from asyncswagger11.http_client import AsynchronousHttpClient
+from asyncswagger11.models import ModelRegistry
 from asyncswagger11.processors import WebsocketProcessor, SwaggerProcessor
+from asyncswagger11.snapshot import SNAPSHOT_SUFFIX, load_snapshot
+from asyncswagger11.validators import coerce_string, compile_validator
 
 log = logging.getLogger(__name__)
 
@@ -36,107 +44,435 @@ class ClientProcessor(SwaggerProcessor):
         name, ext = os.path.splitext(os.path.basename(listing_api['path']))
         listing_api['name'] = name
 
+#: Splits a URI template into literal text and parameter names.
+PATH_PARAM_RE = re.compile(r'\{([^}]*)\}')
+
+#: Characters quote_plus() leaves alone.
+SAFE_CHARS = ('ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+              'abcdefghijklmnopqrstuvwxyz'
+              '0123456789_.-~')
+
+
+def quote_path(value):
+    """quote_plus() with a shortcut for values that need no quoting.
+
+    :param value: Path parameter value.
+    :return: URI-safe string.
+    """
+    value = str(value)
+    if not value.rstrip(SAFE_CHARS):
+        return value
+    return urllib.parse.quote_plus(value)
+
+
+# Indices of the per-call buckets parameters are sorted into.
+PATH, QUERY, BODY, UNSUPPORTED = range(4)
+PARAM_BUCKETS = {'path': PATH, 'query': QUERY, 'body': BODY}
+
+
+class RequestPlan(object):
+    """Precompiled request layout of an operation.
+
+    Everything that only depends on the API declaration is worked out
+    once, so that binding call arguments is a single pass over them.
+
+    :param uri: URI template of the operation.
+    :param operation: Operation model.
+    """
+
+    __slots__ = ('nickname', 'method', 'is_websocket', 'response_class',
+                 'uri', 'segments', 'path_slots', 'buckets', 'required_slots',
+                 'unsupported', 'validators')
+
+    def __init__(self, uri, operation):
+        self.nickname = operation['nickname']
+        self.method = operation['httpMethod']
+        self.is_websocket = operation.get('is_websocket', False)
+        self.response_class = operation.get('responseClass')
+        self.uri = uri
+        # "/a/{b}/c" => ("/a/", "b", "/c"): odd entries are parameter names
+        self.segments = tuple(PATH_PARAM_RE.split(uri))
+        self.path_slots = tuple(
+            (pos, self.segments[pos])
+            for pos in range(1, len(self.segments), 2))
+
+        self.buckets = {}
+        self.unsupported = None
+        self.validators = {}
+        required = []
+        for param in operation.get('parameters', []):
+            pname = param['name']
+            validator = compile_validator(param)
+            if validator is not None:
+                self.validators[pname] = validator
+            bucket = PARAM_BUCKETS.get(param['paramType'], UNSUPPORTED)
+            if bucket == UNSUPPORTED:
+                if self.unsupported is None:
+                    self.unsupported = {}
+                self.unsupported[pname] = param['paramType']
+            self.buckets[pname] = bucket
+            if param.get('required'):
+                required.append((pname, bucket))
+        self.required_slots = tuple(required)
+
+    def __repr__(self):
+        return "%s(%s %s)" % (self.__class__.__name__, self.method, self.uri)
+
+    def _names(self, bucket):
+        return frozenset(
+            pname for pname, pbucket in self.buckets.items()
+            if pbucket == bucket)
+
+    @property
+    def path_params(self):
+        """Names of the path parameters."""
+        return self._names(PATH)
+
+    @property
+    def query_params(self):
+        """Names of the query parameters."""
+        return self._names(QUERY)
+
+    @property
+    def body_params(self):
+        """Names of the body parameters."""
+        return self._names(BODY)
+
+    @property
+    def required(self):
+        """Names of the required parameters."""
+        return frozenset(pname for pname, bucket in self.required_slots)
+
+    def bind(self, kwargs, validate=True):
+        """Sort call arguments into URI, query parameters and body.
+
+        :param kwargs: Operation arguments.
+        :param validate: Check the arguments' types and values, see the
+                         validators module.
+        :return: (uri, params, data) tuple; data is None if there is
+                 no body.
+        :raise: TypeError: on missing or unknown arguments, or arguments
+                of the wrong type.
+        :raise: ValueError: on arguments that are not allowable values.
+        """
+        values = ({}, {}, {}, {})
+        buckets = self.buckets
+        validators = self.validators if validate else None
+        unknown = []
+        for pname, value in kwargs.items():
+            try:
+                bucket = buckets[pname]
+            except KeyError:
+                unknown.append(pname)
+                continue
+            if value is None:
+                continue
+            if validators:
+                validator = validators.get(pname)
+                # Most arguments are strings for string parameters
+                if validator is not None and not (
+                        validator is coerce_string and type(value) is str):
+                    try:
+                        value = validator(value)
+                    except (TypeError, ValueError) as err:
+                        raise type(err)(
+                            "Invalid parameter '%s' for '%s': %s" %
+                            (pname, self.nickname, err)) from None
+            # Turn list params into comma separated values; validated
+            # ones already are
+            if isinstance(value, list):
+                value = ",".join(map(str, value))
+            values[bucket][pname] = value
+
+        for pname, bucket in self.required_slots:
+            if pname not in values[bucket]:
+                raise TypeError(
+                    "Missing required parameter '%s' for '%s'" %
+                    (pname, self.nickname))
+        if unknown:
+            raise TypeError("'%s' does not have parameters %r" %
+                            (self.nickname, unknown))
+        path, params, data, unsupported = values
+        if unsupported:
+            raise AssertionError("Unsupported paramType %s" %
+                                 self.unsupported[next(iter(unsupported))])
+
+        if path:
+            segments = list(self.segments)
+            for pos, pname in self.path_slots:
+                if pname in path:
+                    segments[pos] = quote_path(path[pname])
+                else:
+                    segments[pos] = '{%s}' % pname
+            uri = ''.join(segments)
+        else:
+            uri = self.uri
+        return uri, params, data or None
+
+
 class Operation(object):
     """async Operation object.
+
+    Only the operation's compiled RequestPlan is kept, not its model.
+
+    :param plan: Compiled operation, shared by all clients of an API.
+    :type  plan: RequestPlan
+    :param http_client: HTTP client API
+    :param trace: Optional callback, see SwaggerClient.
+    :param base_url: Prefix for the plan's URI.
+    :param decode: If set, the response body is decoded and passed to
+                   this function, whose result is returned instead of
+                   the response. See models.ModelRegistry.decoder().
+    :param validate: Check arguments before sending the request.
     """
 
-    def __init__(self, uri, operation, http_client):
-        self.uri = uri
-        self.json = operation
+    __slots__ = ('plan', 'http_client', 'trace', 'base_url', 'decode',
+                 'validate')
+
+    def __init__(self, plan, http_client, trace=None, base_url='',
+                 decode=None, validate=True):
+        self.plan = plan
         self.http_client = http_client
+        self.trace = trace
+        self.base_url = base_url
+        self.decode = decode
+        self.validate = validate
 
     def __repr__(self):
-        try:
-            return "%s(%s)" % (self.__class__.__name__, self.json['nickname'])
-        except Exception:
-            return "%s(?)" % (self.__class__.__name__,)
+        return "%s(%s)" % (self.__class__.__name__, self.plan.nickname)
 
-    async def __call__(self, **kwargs):
+    @property
+    def nickname(self):
+        """The operation's nickname."""
+        return self.plan.nickname
+
+    @property
+    def uri(self):
+        """The operation's URI template."""
+        return self.base_url + self.plan.uri
+
+    def __call__(self, **kwargs):
         """Invoke ARI operation.
 
+        Websocket operations may also be used as an async context
+        manager, which closes the connection on exit::
+
+            async with client.events.eventWebsocket(app='demo') as ws:
+                ...
+
         :param kwargs: ARI operation arguments.
         :return: Implementation specific response or WebSocket connection
         """
-        log.debug("%s?%r" % (self.json['nickname'], urllib.parse.urlencode(kwargs)))
-        method = self.json['httpMethod']
-        uri = self.uri
-        params = {}
-        data = None
-        headers = {"Accept": "application/json"}
-        for param in self.json.get('parameters', []):
-            pname = param['name']
-            value = kwargs.get(pname)
-            # Turn list params into comma separated values
-            if isinstance(value, list):
-                value = ",".join(value)
-
-            if value is not None:
-                if param['paramType'] == 'path':
-                    uri = uri.replace('{%s}' % pname,
-                                      urllib.parse.quote_plus(str(value)))
-                elif param['paramType'] == 'query':
-                    params[pname] = value
-                elif param['paramType'] == 'body':
-                    if not data:
-                        data = {}
-                    data[pname] = value
-                else:
-                    raise AssertionError(
-                        "Unsupported paramType %s" %
-                        param['paramType'])
-                del kwargs[pname]
-            else:
-                if param['required']:
-                    raise TypeError(
-                        "Missing required parameter '%s' for '%s'" %
-                        (pname, self.json['nickname']))
-        if kwargs:
-            raise TypeError("'%s' does not have parameters %r" %
-                            (self.json['nickname'], kwargs.keys()))
+        if self.plan.is_websocket:
+            return WebsocketCall(self._call(kwargs))
+        return self._call(kwargs)
 
-        log.debug("%s %s(%r)", method, uri, params)
+    async def _call(self, kwargs):
+        """Invoke ARI operation.
 
+        :param kwargs: ARI operation arguments.
+        """
+        plan = self.plan
+        method = plan.method
+        uri, params, data = plan.bind(kwargs, self.validate)
+        uri = self.base_url + uri
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("%s?%s", plan.nickname, urllib.parse.urlencode(kwargs))
+            log.debug("%s %s(%r)", method, uri, params)
+
+        if self.trace is None:
+            ret = await self._send(plan, uri, params, data)
+        else:
+            started = time.monotonic()
+            status = None
+            try:
+                ret = await self._send(plan, uri, params, data)
+                status = 101 if plan.is_websocket else ret.status_code
+            except Exception as exc:
+                response = getattr(exc, 'response', None)
+                status = getattr(response, 'status_code', None)
+                raise
+            finally:
+                self.trace(plan.nickname, method, uri,
+                           time.monotonic() - started, status)
+
+        if self.decode is None or plan.is_websocket:
+            return ret
+        content = ret.content
+        if not content:
+            return None
+        return self.decode(self.http_client.codec.loads(content))
+
+    async def _send(self, plan, uri, params, data):
+        """Send a bound request.
+
+        :param plan: The operation's RequestPlan.
+        :param uri: Request URI.
+        :param params: Query parameters.
+        :param data: Body parameters, or None.
+        """
+        method = plan.method
+        headers = {"Accept": "application/json"}
         if data:
-            data = json.dumps(data)
+            data = self.http_client.codec.dumps(data)
             headers['Content-type'] = 'application/json'
 
-        if self.json['is_websocket']:
-            # Fix up http: URLs
-            uri = re.sub('^http', "ws", uri)
-            if data:
-                raise NotImplementedError(
-                    "Sending body data with websockets not implmented")
-            headers = list(headers.items())
+        if plan.is_websocket:
+            uri, headers = self._ws_args(uri, headers, data)
             ret = await self.http_client.ws_connect(uri, params=params,
                     headers=headers)
         else:
             ret = await self.http_client.request(
-                method, uri, params=params, headers=headers, data=data)
+                method, uri, params=params, headers=headers, data=data,
+                operation=plan.nickname)
         return ret
 
+    def _ws_args(self, uri, headers, data):
+        """Adapt request arguments for a websocket.
+
+        :return: (uri, headers) tuple.
+        """
+        # Fix up http: URLs
+        uri = re.sub('^http', "ws", uri)
+        if data:
+            raise NotImplementedError(
+                "Sending body data with websockets not implmented")
+        return uri, list(headers.items())
+
+    def _bind_ws(self, kwargs):
+        """Bind arguments of a websocket operation.
+
+        :return: (uri, params, headers) tuple.
+        """
+        plan = self.plan
+        if not plan.is_websocket:
+            raise TypeError("'%s' is not a websocket operation" %
+                            (plan.nickname,))
+        uri, params, data = plan.bind(kwargs, self.validate)
+        uri, headers = self._ws_args(
+            self.base_url + uri, {"Accept": "application/json"}, data)
+        return uri, params, headers
+
+    def supervise(self, **kwargs):
+        """Open a websocket operation in supervised mode.
+
+        The connection is re-established whenever it is lost; see
+        http_client.SupervisedWebsocket.
+
+        :param kwargs: ARI operation arguments.
+        :rtype: http_client.SupervisedWebsocket
+        """
+        uri, params, headers = self._bind_ws(kwargs)
+        return self.http_client.ws_supervise(uri, params=params,
+                                             headers=headers)
+
+    def multiplex(self, **kwargs):
+        """Get the shared multiplexer for a websocket operation.
+
+        Calls with the same arguments share one connection; see
+        events.WebsocketMultiplexer.
+
+        :param kwargs: ARI operation arguments.
+        :rtype: events.WebsocketMultiplexer
+        """
+        uri, params, headers = self._bind_ws(kwargs)
+        return self.http_client.ws_multiplex(uri, params=params,
+                                             headers=headers)
+
+
+class LazyMap(collections.abc.Mapping):
+    """Read-only mapping that builds its values on first access.
+
+    :param sources: Maps each key to whatever its value is built from.
+    :type  sources: dict
+    :param factory: Called with a key's source to build its value.
+    :type  factory: callable
+    """
+
+    __slots__ = ('sources', 'factory', 'built')
+
+    def __init__(self, sources, factory):
+        self.sources = sources
+        self.factory = factory
+        self.built = {}
+
+    def __repr__(self):
+        return "%s(%s)" % (self.__class__.__name__, list(self.sources))
+
+    def __getitem__(self, key):
+        try:
+            return self.built[key]
+        except KeyError:
+            pass
+        value = self.factory(self.sources[key])
+        self.built[key] = value
+        return value
+
+    def __contains__(self, key):
+        return key in self.sources
+
+    def __iter__(self):
+        return iter(self.sources)
+
+    def __len__(self):
+        return len(self.sources)
+
+
+class WebsocketCall(object):
+    """Pending websocket operation call.
+
+    Await it to get the connection, or use it as an async context
+    manager to have the connection closed when done.
+
+    :param call: Coroutine opening the connection.
+    """
+
+    __slots__ = ('call', 'websocket')
+
+    def __init__(self, call):
+        self.call = call
+        self.websocket = None
+
+    def __await__(self):
+        return self.call.__await__()
+
+    async def __aenter__(self):
+        self.websocket = await self.call
+        return self.websocket
+
+    async def __aexit__(self, *exc):
+        await self.websocket.close()
+
 
 class Resource(object):
     """Swagger resource, described in an API declaration.
 
     :param resource: Resource model
+    :type  resource: ResourceModel
     :param http_client: HTTP client API
+    :param trace: Optional callback, see SwaggerClient.
+    :param base_url: Use this instead of the resource's basePath.
+    :param typed: Decode responses into model objects.
+    :param validate: Check arguments before sending requests.
     """
 
-    def __init__(self, resource, http_client):
-        # log.debug("Building resource '%s'" % resource['name'])
-        self.json = resource
-        decl = resource['api_declaration']
+    __slots__ = ('name', 'http_client', 'trace', 'base_url', 'models',
+                 'validate', 'operations')
+
+    def __init__(self, resource, http_client, trace=None, base_url=None,
+                 typed=False, validate=True):
+        # log.debug("Building resource '%s'" % resource.name)
+        self.name = resource.name
         self.http_client = http_client
-        self.operations = {
-            oper['nickname']: self._build_operation(decl, api, oper)
-            for api in decl['apis']
-            for oper in api['operations']}
+        self.trace = trace
+        self.base_url = base_url or resource.base_path
+        self.models = resource.models if typed else None
+        self.validate = validate
+        # Operation objects are built when first used.
+        self.operations = LazyMap(resource.plans, self._build_operation)
 
     def __repr__(self):
-        try:
-            return "%s(%s)" % (self.__class__.__name__, self.json['name'])
-        except Exception:
-            return "%s(?)" % (self.__class__.__name__,)
+        return "%s(%s)" % (self.__class__.__name__, self.name)
 
     def __getattr__(self, item):
         """Promote operations to be object fields.
@@ -167,60 +503,351 @@ class Resource(object):
 
         :return: Resource name.
         """
-        return self.json.get('name')
+        return self.name
 
-    def _build_operation(self, decl, api, operation):
+    def _build_operation(self, plan):
         """Build an asynchronous operation object
 
-        :param decl: API declaration.
-        :param api: API entry.
-        :param operation: Operation.
+        :param plan: The operation's compiled plan.
+        :type  plan: RequestPlan
         """
         # log.debug("Building operation %s.%s" % (
-        #   self.get_name(), operation['nickname']))
-        uri = decl['basePath'] + api['path']
-        return Operation(uri, operation, self.http_client)
+        #   self.get_name(), plan.nickname))
+        decode = None
+        if self.models is not None:
+            decode = self.models.decoder(plan.response_class)
+        return Operation(plan, self.http_client, self.trace, self.base_url,
+                         decode, self.validate)
+
+
+class ResourceModel(object):
+    """Immutable, processed form of an API declaration.
+
+    :param resource: Processed resource listing entry.
+    :param models: Model classes of the whole listing. Defaults to the
+                   declaration's own models.
+    :type  models: models.ModelRegistry
+    """
+
+    __slots__ = ('_name', '_base_path', '_plans', '_models')
+
+    def __init__(self, resource, models=None):
+        decl = resource['api_declaration']
+        self._name = resource['name']
+        self._base_path = decl['basePath']
+        self._plans = {
+            oper['nickname']: RequestPlan(api['path'], oper)
+            for api in decl['apis']
+            for oper in api['operations']}
+        if models is None:
+            models = ModelRegistry(decl.get('models') or {})
+        self._models = models
+
+    def __repr__(self):
+        return "%s(%s)" % (self.__class__.__name__, self._name)
+
+    @property
+    def name(self):
+        """Name of the resource."""
+        return self._name
+
+    @property
+    def base_path(self):
+        """Base path of the resource's operations."""
+        return self._base_path
+
+    @property
+    def plans(self):
+        """The resource's RequestPlans, by operation nickname."""
+        return types.MappingProxyType(self._plans)
+
+    @property
+    def models(self):
+        """The model classes available to the declaration.
+
+        :rtype: models.ModelRegistry
+        """
+        return self._models
+
+
+class ApiModel(object):
+    """Immutable, processed form of a Swagger API.
+
+    Building the model compiles every operation. Of the listing it was
+    built from, only the model definitions of each declaration stay
+    referenced, by its ModelRegistry. A model may be shared by any
+    number of SwaggerClient instances, each with its own HTTP client and
+    base URL.
+
+    :param resource_listing: Resource listing, processed for clients.
+    :type  resource_listing: dict
+    """
+
+    __slots__ = ('_url', '_base_path', '_resources')
+
+    def __init__(self, resource_listing):
+        self._url = resource_listing.get('url')
+        self._base_path = resource_listing.get('basePath')
+        definitions = {}
+        for resource in resource_listing['apis']:
+            for name, model in (resource['api_declaration'].get('models')
+                                or {}).items():
+                definitions.setdefault(name, model)
+        models = ModelRegistry(definitions)
+        self._resources = {
+            resource['name']: ResourceModel(resource, models)
+            for resource in resource_listing['apis']}
+
+    def __repr__(self):
+        return "%s(%s)" % (self.__class__.__name__, self._base_path)
+
+    @classmethod
+    async def load(cls, url, http_client, cache=None):
+        """Load and process an API for use by clients.
+
+        :param url: URL of the resource listing.
+        :param http_client: HTTP client API to load with.
+        :param cache: Cache for the processed API model
+        :type  cache: asyncswagger11.cache.SpecCache
+        :rtype: ApiModel
+        """
+        loader = asyncswagger11.Loader(http_client, client_processors(),
+                                       cache=cache)
+        return cls(await loader.load_resource_listing(url))
+
+    @property
+    def url(self):
+        """URL the API was loaded from, if any."""
+        return self._url
+
+    @property
+    def base_path(self):
+        """Base path of the API."""
+        return self._base_path
+
+    @property
+    def resources(self):
+        """The API's resources, by name."""
+        return types.MappingProxyType(self._resources)
+
+
+def client_processors():
+    """Returns the processors that prepare a listing for client use."""
+    return [WebsocketProcessor(), ClientProcessor()]
+
 
 class SwaggerClient(object):
     """Client object for accessing a Swagger-documented RESTful service.
 
     :param url_or_resource: Either the parsed resource listing+API decls, or
-                            its URL.
+                            its URL. A file name (or file: URL) ending in
+                            .swagger-snapshot is read as a snapshot, see
+                            the snapshot module.
     :type url_or_resource: dict or str
     :param http_client: HTTP client API
     :type  http_client: HttpClient
+    :param cache: Cache for the processed API model
+    :type  cache: asyncswagger11.cache.SpecCache
+    :param trace: Optional callback, invoked after every operation call
+                  as trace(nickname, method, uri, elapsed, status).
+                  elapsed is in seconds; status is the HTTP status code
+                  (101 for websockets), or None if there was no response.
+    :type  trace: callable
+    :param model: Use this already-processed API instead of loading it.
+                  url is ignored if this is set.
+    :type  model: ApiModel
+    :param base_url: Send requests here instead of to the API's
+                     basePath.
+    :param typed: Return the decoded response body as instances of the
+                  declared models (see the models module) instead of
+                  the raw response. Websocket operations are unaffected.
+    :param validate: Check argument types and values (see the validators
+                     module) before sending a request. Turn this off to
+                     save the time in well-tested code.
+    :param snapshot_hash: The expected hash of the API in a snapshot.
+
+    Further keyword arguments are passed to the AsynchronousHttpClient
+    that is created when no http_client is given, e.g. to configure its
+    connection pool and timeouts.
     """
 
-    def __init__(self, url=None, username='', password='', http_client=None):
+    def __init__(self, url=None, username='', password='', http_client=None,
+                 cache=None, trace=None, model=None, base_url=None,
+                 typed=False, validate=True, snapshot_hash=None,
+                 **http_args):
+        self.owns_http_client = not http_client
         if not http_client:
-            http_client = AsynchronousHttpClient(username, password)
+            http_client = AsynchronousHttpClient(username, password,
+                                                 **http_args)
+        elif http_args:
+            raise RuntimeError("Conflicting arguments:"
+                " configure your http_client directly")
         self.http_client = http_client
         self.url = url
+        self.trace = trace
+        self.model = model
+        self.base_url = base_url
+        self.typed = typed
+        self.validate = validate
+        self.snapshot_hash = snapshot_hash
+        #: The processed resource listing, kept to check it for changes.
+        #: None if the client uses a model passed in by the caller.
+        self.api_docs = None
+        self.snapshot_mtime = None
+        self.reload_lock = anyio.Lock()
         self.loader = asyncswagger11.Loader(
-            self.http_client, [WebsocketProcessor(), ClientProcessor()])
+            self.http_client, client_processors(), cache=cache)
 
     async def init(self):
-        if isinstance(self.url, str):
-            log.debug("Loading from %s" % self.url)
-            self.api_docs = await self.loader.load_resource_listing(self.url)
+        if self.model is not None:
+            log.debug("Using %r", self.model)
+        elif isinstance(self.url, str):
+            self.api_docs = await self._load()
+            self.model = ApiModel(self.api_docs)
         else:
-            log.debug("Loading from %s" % self.url.get('basePath'))
+            log.debug("Loading from %s", self.url.get('basePath'))
             self.api_docs = self.url
             self.loader.process_resource_listing(self.api_docs)
-        self.resources = {
-            resource['name']: Resource(resource, self.http_client)
-            for resource in self.api_docs['apis']}
+            self.model = ApiModel(self.api_docs)
+        # Resource objects are built when first used.
+        self.resources = LazyMap(self.model.resources, self._build_resource)
+
+    def _snapshot_path(self):
+        """File name of the snapshot the API is loaded from, or None.
+
+        :raise: ValueError: for a snapshot URL that is not a file: URL.
+        """
+        if not self.url.endswith(SNAPSHOT_SUFFIX):
+            return None
+        if self.url.startswith('file:'):
+            return urllib.request.url2pathname(
+                urllib.parse.urlsplit(self.url).path)
+        if '://' in self.url:
+            raise ValueError("Snapshots are read from files, not %s" %
+                             (self.url,))
+        return self.url
+
+    def _read_snapshot(self, path):
+        """Read a snapshot file; runs in a worker thread.
+
+        :param path: Name of the snapshot file.
+        :return: (modification time, resource listing) tuple.
+        """
+        mtime = os.stat(path).st_mtime_ns
+        return mtime, load_snapshot(path, self.snapshot_hash)
+
+    async def _load(self, fetched=None):
+        """Load the resource listing from self.url.
+
+        :param fetched: Documents already downloaded by changed().
+        """
+        path = self._snapshot_path()
+        if path is not None:
+            log.debug("Loading snapshot %s", path)
+            mtime, api_docs = await anyio.to_thread.run_sync(
+                self._read_snapshot, path)
+            # Only now: a snapshot that failed to load is tried again
+            self.snapshot_mtime = mtime
+            return api_docs
+        log.debug("Loading from %s", self.url)
+        return await self.loader.load_resource_listing(self.url,
+                                                       fetched=fetched)
+
+    async def changed(self, fetched=None):
+        """Check whether the API has changed since it was loaded.
+
+        Every API document is revalidated with a conditional request
+        (or by its modification time, for files); a snapshot is checked
+        by its modification time.
+
+        :param fetched: Stores the changed documents, by URL, so that
+                        reload() need not download them again.
+        :type  fetched: dict
+        :return: False if the API was not loaded from a URL.
+        """
+        if self.api_docs is None or not isinstance(self.url, str):
+            return False
+        path = self._snapshot_path()
+        if path is not None:
+            st = await anyio.to_thread.run_sync(os.stat, path)
+            return st.st_mtime_ns != self.snapshot_mtime
+        return not await self.loader.revalidate(self.api_docs, fetched)
+
+    async def reload(self, force=False):
+        """Load the API again if it has changed.
+
+        The new model is built completely before it replaces the old
+        one, so there is no moment without a usable API. Calls that
+        are running finish with the operation they started with; Resource
+        and Operation objects that were fetched before the reload keep
+        using the old model. The HTTP client, and with it the connection
+        pool, is not replaced.
+
+        :param force: Load the API without checking for changes.
+        :return: True if the model was replaced.
+        :raise: Whatever loading the API raises; the old model is kept.
+        """
+        async with self.reload_lock:
+            fetched = {}
+            if not force and not await self.changed(fetched):
+                return False
+            api_docs = await self._load(fetched)
+            model = ApiModel(api_docs)
+            self.api_docs, self.model = api_docs, model
+            self.resources = LazyMap(model.resources, self._build_resource)
+        log.info("Reloaded the API from %s", self.url)
+        return True
+
+    async def watch(self, interval=60, on_reload=None,
+                    task_status=anyio.TASK_STATUS_IGNORED):
+        """Reload the API whenever it changes.
+
+        Runs until cancelled, checking every interval seconds::
+
+            async with anyio.create_task_group() as tg:
+                await tg.start(client.watch, 30)
+                ...
+
+        Failures to check or load are logged; the client keeps its
+        current model until a later attempt succeeds.
+
+        :param interval: Seconds between checks.
+        :param on_reload: Called with the new ApiModel after a reload.
+        """
+        task_status.started()
+        while True:
+            await anyio.sleep(interval)
+            try:
+                reloaded = await self.reload()
+            except Exception:
+                log.warning("Reloading the API from %s failed", self.url,
+                            exc_info=True)
+                continue
+            if reloaded and on_reload is not None:
+                on_reload(self.model)
+
+    def _build_resource(self, resource):
+        """Build a client resource object.
+
+        :param resource: Resource model.
+        :type  resource: ResourceModel
+        """
+        return Resource(resource, self.http_client, self.trace,
+                        self.base_url, self.typed, self.validate)
 
     async def __aenter__(self):
         await self.init()
         return self
 
-    async def __aexit(self, *err):
-        pass
+    async def __aexit__(self, *err):
+        # An http_client passed in by the caller may be shared.
+        if self.owns_http_client:
+            await self.close()
 
     def __repr__(self):
         try:
-            return "%s(%s)" % (self.__class__.__name__, self.api_docs['basePath'])
+            return "%s(%s)" % (self.__class__.__name__,
+                               self.base_url or self.model.base_path)
         except Exception:
             return "%s(?)" % (self.__class__.__name__,)
 
@@ -240,6 +867,21 @@ class SwaggerClient(object):
         """
         await self.http_client.close()
 
+    def batch(self, limit=10, per_host=None, fail_fast=False):
+        """Run many operations concurrently.
+
+        See batch.Batch for the arguments. limit is capped at the size
+        of the HTTP client's connection pool, so that calls don't wait
+        for connections while holding a slot.
+
+        :rtype: batch.Batch
+        """
+        pool = getattr(self.http_client, 'max_connections', None)
+        if pool is not None and limit > pool:
+            log.debug("Batch limit %d capped at pool size %d", limit, pool)
+            limit = pool
+        return Batch(limit=limit, per_host=per_host, fail_fast=fail_fast)
+
     def get_resource(self, name):
         """Gets a Swagger resource by name.
 
@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+
+#
+# Copyright (c) 2018, Matthias Urlichs
+#
+
+"""JSON encoding and decoding.
+
+Request bodies, responses, API documents and websocket events all go
+through a codec. orjson or ujson is used when installed, the standard
+library's json module otherwise.
+
+A codec encodes to UTF-8 bytes, which are sent as-is, and decodes both
+bytes and str.
+"""
+
+import json
+
+
+class Codec(object):
+    """Interface for a JSON codec.
+    """
+
+    #: Name of the codec, see get_codec().
+    name = None
+
+    def dumps(self, obj):
+        """Encode an object.
+
+        :param obj: JSON-compatible object.
+        :return: UTF-8 encoded JSON.
+        :rtype: bytes
+        """
+        raise NotImplementedError(
+            "%s: Method not implemented", self.__class__.__name__)
+
+    def loads(self, data):
+        """Decode JSON.
+
+        :param data: UTF-8 encoded JSON.
+        :type  data: bytes or str
+        :raise ValueError: if data isn't valid JSON.
+        """
+        raise NotImplementedError(
+            "%s: Method not implemented", self.__class__.__name__)
+
+    def __repr__(self):
+        return "%s()" % (self.__class__.__name__,)
+
+
+class StdlibCodec(Codec):
+    """Codec based on the standard library's json module.
+    """
+
+    name = 'json'
+
+    def __init__(self):
+        self.encoder = json.JSONEncoder(ensure_ascii=False,
+                                        separators=(',', ':'))
+        self.loads = json.loads
+
+    def dumps(self, obj):
+        return self.encoder.encode(obj).encode('utf-8')
+
+
+class OrjsonCodec(Codec):
+    """Codec based on orjson.
+    """
+
+    name = 'orjson'
+
+    def __init__(self):
+        import orjson
+
+        self.dumps = orjson.dumps
+        self.loads = orjson.loads
+
+
+class UjsonCodec(Codec):
+    """Codec based on ujson.
+    """
+
+    name = 'ujson'
+
+    def __init__(self):
+        import ujson
+
+        self._dumps = ujson.dumps
+        self.loads = ujson.loads
+
+    def dumps(self, obj):
+        return self._dumps(obj, ensure_ascii=False).encode('utf-8')
+
+
+#: Codecs in order of preference.
+CODECS = (OrjsonCodec, UjsonCodec, StdlibCodec)
+
+
+def get_codec(name=None):
+    """Get a codec.
+
+    :param name: Name of the codec. None picks the fastest one that is
+                 installed.
+    :rtype: Codec
+    :raise ValueError: if the codec is unknown.
+    :raise ImportError: if the codec's library isn't installed.
+    """
+    for codec in CODECS:
+        if name is None:
+            try:
+                return codec()
+            except ImportError:
+                continue
+        elif codec.name == name:
+            return codec()
+    raise ValueError("Unknown codec %r" % (name,))
+
+
+#: The codec used unless configured otherwise.
+default = get_codec()
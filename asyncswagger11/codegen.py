@@ -2,16 +2,420 @@
 
 #
 # Copyright (c) 2013, Digium, Inc.
+# Copyright (c) 2018, Matthias Urlichs
 #
 
 """Main entry point for codegen command line app.
+
+Generates a static client package from a resource listing: one module
+per resource, with a class whose methods are the resource's operations,
+and a Client class in the package's __init__::
+
+    $ python3 -m asyncswagger11.codegen \\
+        http://localhost:8088/ari/api-docs/resources.json ari_client
+
+    from ari_client import Client
+
+    async with Client(username='user', password='pass') as ari:
+        channels = await ari.channels.list()
+
+Each operation becomes an async method with explicit keyword arguments
+that builds its URL and query parameters directly. Importing the
+package needs neither the API documents nor any processing. Arguments
+named like Python keywords, or like the names the method uses itself
+(e.g. ``self``), get a trailing underscore: ``from_``, ``self_``.
+
+Arguments are checked like SwaggerClient does, see the validators
+module; pass ``validate=False`` to Client to send them unchecked.
+Header and form parameters are not supported, nor are websocket
+operations with body parameters: generating a client for an API that
+uses them raises SwaggerError.
 """
 
+import os
 import sys
 
 from optparse import OptionParser
 
-USAGE = "usage: %prog [options] template-dir output-dir"
+import anyio
+
+from asyncswagger11.client import PATH_PARAM_RE, client_processors
+from asyncswagger11.models import attribute_name
+from asyncswagger11.processors import ParsingContext, SwaggerError
+from asyncswagger11.validators import compile_validator
+
+USAGE = "usage: %prog [options] resource-listing output-dir"
+
+#: Names a generated method uses itself, so arguments can't have them.
+RESERVED_ARGS = frozenset((
+    'self', '_params', '_data', '_headers',
+    '_check', '_multi', '_ws', 'quote_path', 'WebsocketCall'))
+
+#: Parameter fields the validators module looks at.
+VALIDATOR_FIELDS = ('dataType', 'allowableValues', 'allowMultiple')
+
+MODULE_HEADER = '''\
+"""%(description)s
+
+Generated by asyncswagger11.codegen from %(source)s.
+Do not edit.
+"""
+
+from asyncswagger11.client import WebsocketCall, quote_path
+from asyncswagger11.validators import compile_validator
+
+#: Base path of the API declaration.
+BASE_PATH = %(base_path)r
+
+
+def _check(nickname, pname, value):
+    if value is None:
+        return None
+    try:
+        return VALIDATORS[nickname, pname](value)
+    except (TypeError, ValueError) as err:
+        raise type(err)("Invalid parameter '%%s' for '%%s': %%s" %%
+                        (pname, nickname, err)) from None
+
+
+def _multi(value):
+    if isinstance(value, list):
+        return ",".join(map(str, value))
+    return value
+
+
+def _ws(url):
+    if url.startswith('http'):
+        return 'ws' + url[4:]
+    return url
+'''
+
+PACKAGE_TEMPLATE = '''\
+"""Client for %(base_path)s.
+
+Generated by asyncswagger11.codegen from %(source)s.
+Do not edit.
+"""
+
+from asyncswagger11.http_client import AsynchronousHttpClient
+
+%(imports)s
+
+#: Base path of the resource listing.
+BASE_PATH = %(base_path)r
+
+
+class Client(object):
+    """Static client for %(base_path)s.
+
+    :param base_url: Send requests here instead of to the API's
+                     basePath.
+    :param http_client: HTTP client API. By default an
+                        AsynchronousHttpClient is created with the
+                        remaining keyword arguments.
+    :param validate: Check operation arguments against the parameters'
+                     declared types and allowable values.
+    """
+
+    def __init__(self, base_url=None, http_client=None, validate=True,
+                 **http_args):
+        self.owns_http_client = http_client is None
+        if http_client is None:
+            http_client = AsynchronousHttpClient(**http_args)
+        elif http_args:
+            raise RuntimeError("Conflicting arguments:"
+                " configure your http_client directly")
+        self.http_client = http_client
+%(resources)s
+
+    def __repr__(self):
+        return "%%s()" %% (self.__class__.__name__,)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *err):
+        # An http_client passed in by the caller may be shared.
+        if self.owns_http_client:
+            await self.close()
+
+    async def close(self):
+        """Close the client, and underlying resources.
+        """
+        await self.http_client.close()
+'''
+
+
+def identifier(name):
+    """A Python identifier for a name from the API.
+
+    The same rules apply as for model attributes, see
+    models.attribute_name().
+
+    :param name: Resource, operation or parameter name.
+    """
+    return attribute_name(name)
+
+
+def class_name(name):
+    """Class name for a resource.
+
+    :param name: Name of the resource.
+    """
+    name = identifier(name)
+    return name[0].upper() + name[1:]
+
+
+def render_docstring(text, indent):
+    """A docstring with the given text.
+
+    :param text: Text of the docstring, or None.
+    :param indent: Indentation of the docstring.
+    """
+    text = (text or "").strip().replace('\\', '\\\\').replace('"""', '\\"""')
+    if not text:
+        return []
+    return [indent + '"""%s' % (text,), indent + '"""']
+
+
+def unsupported(operation, param, msg):
+    """SwaggerError for a parameter the generated code cannot send.
+
+    :param operation: Processed operation model.
+    :param param: Parameter model.
+    :param msg: Error message.
+    """
+    context = ParsingContext()
+    context.push('operation', operation, 'nickname')
+    context.push('parameter', param, 'name')
+    return SwaggerError(msg, context)
+
+
+def render_operation(path, operation, validators):
+    """Generate the method of an operation.
+
+    :param path: Path of the operation, relative to the base path.
+    :param operation: Processed operation model.
+    :param validators: Collects the parameters to check, as
+                       {(nickname, name): parameter fields}.
+    :return: Source lines.
+    :raise: SwaggerError: if the operation has parameters the generated
+            code cannot send.
+    """
+    required = []
+    optional = []
+    placement = {}
+    params = list(operation.get('parameters', []))
+    declared = set(param['name'] for param in params)
+    for pname in PATH_PARAM_RE.findall(path):
+        if pname not in declared:
+            params.append({'name': pname, 'paramType': 'path'})
+    used = set(RESERVED_ARGS)
+    for param in params:
+        arg = identifier(param['name'])
+        while arg in used:
+            arg += '_'
+        used.add(arg)
+        placement[param['name']] = (arg, param)
+        if param.get('required') or param['paramType'] == 'path':
+            required.append(arg)
+        else:
+            optional.append(arg)
+
+    signature = ['self']
+    if required or optional:
+        signature.append('*')
+    signature.extend(required)
+    signature.extend('%s=None' % (arg,) for arg in optional)
+
+    nickname = operation['nickname']
+    name = identifier(nickname)
+    is_websocket = operation.get('is_websocket', False)
+    lines = []
+    if is_websocket:
+        lines.append('    def %s(%s):' % (name, ', '.join(signature)))
+    else:
+        lines.append('    async def %s(%s):' % (name, ', '.join(signature)))
+    lines.extend(render_docstring(operation.get('summary'), '        '))
+
+    # Same checks as RequestPlan.bind()
+    checked = []
+    for pname, (arg, param) in placement.items():
+        fields = dict((field, param[field]) for field in VALIDATOR_FIELDS
+                      if field in param)
+        if compile_validator(fields) is not None:
+            validators[nickname, pname] = fields
+            checked.append((pname, arg))
+    if checked:
+        lines.append('        if self.validate:')
+        for pname, arg in checked:
+            lines.append('            %s = _check(%r, %r, %s)' % (
+                arg, nickname, pname, arg))
+
+    # URL: literal text and quoted path parameters
+    url = ['self.base_url']
+    for pos, part in enumerate(PATH_PARAM_RE.split(path)):
+        if pos % 2:
+            url.append('quote_path(%s)' % (placement[part][0],))
+        elif part:
+            url.append(repr(part))
+    url = ' + '.join(url)
+
+    # Query parameters and body
+    params = data = False
+    for pname, (arg, param) in placement.items():
+        where = param['paramType']
+        if where == 'path':
+            continue
+        if where not in ('query', 'body'):
+            raise unsupported(operation, param,
+                              "Unsupported paramType %s" % (where,))
+        if where == 'body' and is_websocket:
+            raise unsupported(operation, param,
+                              "Sending body data with websockets "
+                              "not implemented")
+        if where == 'query':
+            target = '_params'
+            if not params:
+                lines.append('        _params = {}')
+                params = True
+        else:
+            target = '_data'
+            if not data:
+                lines.append('        _data = {}')
+                data = True
+        value = '_multi(%s)' % (arg,) if param.get('allowMultiple') else arg
+        if arg in required:
+            lines.append('        %s[%r] = %s' % (target, pname, value))
+        else:
+            lines.append('        if %s is not None:' % (arg,))
+            lines.append('            %s[%r] = %s' % (target, pname, value))
+
+    body, cont = ' ' * 8, ' ' * 12
+    if is_websocket:
+        lines.append(body + 'return WebsocketCall(')
+        lines.append(cont + 'self.http_client.ws_connect(_ws(%s),' % (url,))
+        lines.append(cont + 'params=%s,' % ('_params' if params else 'None',))
+        lines.append(cont + "headers=[('Accept', 'application/json')]))")
+        return lines
+
+    lines.append(body + "_headers = {'Accept': 'application/json'}")
+    if data:
+        lines.append(body + 'if _data:')
+        lines.append(cont + '_data = self.http_client.codec.dumps(_data)')
+        lines.append(cont + "_headers['Content-type'] = 'application/json'")
+        lines.append(body + 'else:')
+        lines.append(cont + '_data = None')
+    lines.append('        return await self.http_client.request(')
+    lines.append('            %r, %s,' % (operation['httpMethod'], url))
+    lines.append('            params=%s, data=%s, headers=_headers,' % (
+        '_params' if params else 'None', '_data' if data else 'None'))
+    lines.append('            operation=%r)' % (operation['nickname'],))
+    return lines
+
+
+def render_resource(resource, source):
+    """Generate the module of a resource.
+
+    :param resource: Processed resource listing entry.
+    :param source: Where the API came from, for the module docstring.
+    :return: Source code.
+    :raise: SwaggerError: if an operation has parameters the generated
+            code cannot send.
+    """
+    decl = resource['api_declaration']
+    name = class_name(resource['name'])
+    description = resource.get('description') or \
+        "The %s resource." % (resource['name'],)
+    header = MODULE_HEADER % dict(
+        description=description.strip().replace('"""', "'''"),
+        source=source, base_path=decl['basePath'])
+    lines = ['class %s(object):' % (name,)]
+    lines.extend(render_docstring(description, '    '))
+    lines.append('')
+    lines.append("    __slots__ = ('http_client', 'base_url', 'validate')")
+    lines.append('')
+    lines.append('    def __init__(self, http_client, base_url=None, '
+                 'validate=True):')
+    lines.append('        self.http_client = http_client')
+    lines.append('        self.base_url = base_url or BASE_PATH')
+    lines.append('        self.validate = validate')
+    lines.append('')
+    lines.append('    def __repr__(self):')
+    lines.append('        return "%s(%s)" % (self.__class__.__name__, '
+                 'self.base_url)')
+    validators = {}
+    for api in decl['apis']:
+        for operation in api['operations']:
+            lines.append('')
+            lines.extend(render_operation(api['path'], operation, validators))
+
+    # Validators are compiled once, when the module is imported
+    table = ['#: Validators of the checked parameters, by (nickname, name).',
+             'VALIDATORS = {']
+    for key, fields in validators.items():
+        table.append('    %r: compile_validator(%r),' % (key, fields))
+    table.append('}')
+    return '\n'.join([header, ''] + table + ['', ''] + lines) + '\n'
+
+
+def render_package(resource_listing, source):
+    """Generate the package's __init__ module.
+
+    :param resource_listing: Processed resource listing.
+    :param source: Where the API came from, for the module docstring.
+    :return: Source code.
+    """
+    imports = []
+    resources = []
+    for resource in resource_listing['apis']:
+        module = identifier(resource['name'])
+        cls = class_name(resource['name'])
+        imports.append('from .%s import %s' % (module, cls))
+        resources.append(
+            '        self.%s = %s(http_client, base_url, validate)' %
+            (module, cls))
+    return PACKAGE_TEMPLATE % dict(
+        base_path=resource_listing.get('basePath'), source=source,
+        imports='\n'.join(imports), resources='\n'.join(resources))
+
+
+def generate(resource_listing, output_dir, source=None):
+    """Write a client package for a resource listing.
+
+    :param resource_listing: Resource listing, processed for clients.
+    :type  resource_listing: dict
+    :param output_dir: Directory of the package; created if needed.
+    :param source: Where the API came from, for the module docstrings.
+    :return: Paths of the files written.
+    """
+    source = source or resource_listing.get('url') or 'a resource listing'
+    os.makedirs(output_dir, exist_ok=True)
+    written = []
+
+    def write(name, text):
+        path = os.path.join(output_dir, name)
+        with open(path, 'w') as fp:
+            fp.write(text)
+        written.append(path)
+
+    for resource in resource_listing['apis']:
+        write(identifier(resource['name']) + '.py',
+              render_resource(resource, source))
+    write('__init__.py', render_package(resource_listing, source))
+    return written
+
+
+async def load(source):
+    """Load and process a resource listing for code generation.
+
+    :param source: URL or file name of the resource listing.
+    """
+    from asyncswagger11.swagger_model import load_file, load_url
+
+    if '://' in source:
+        return await load_url(source, processors=client_processors())
+    return await load_file(source, processors=client_processors())
 
 
 def main(argv=None):
@@ -33,8 +437,12 @@ def main(argv=None):
     elif len(args) > 3:
         parser.error("Too many arguments")
 
-    template_dir = args[1]
+    source = args[1]
     output_dir = args[2]
+    resource_listing = anyio.run(load, source)
+    for path in generate(resource_listing, output_dir, source):
+        if options.verbose:
+            print(path)
 
 # And sometimes you just want to run the script...
 if __name__ == "__main__":
@@ -0,0 +1,311 @@
+#
+# Copyright (c) 2018, Matthias Urlichs
+#
+
+"""Dispatching of websocket events.
+
+ARI, like other Swagger 1.1 APIs with the websocket extension, sends
+events as JSON objects with a 'type' field. An EventDispatcher reads
+them from a websocket and routes them to async handlers; a
+WebsocketMultiplexer shares one websocket between many subscribers.
+"""
+
+import logging
+
+import anyio
+from wsproto.events import Message
+
+from asyncswagger11 import codec as json_codec
+
+log = logging.getLogger(__name__)
+
+#: Overflow policies of a Subscription.
+BLOCK = 'block'
+DROP = 'drop'
+
+
+def decode_message(message, codec=json_codec.default):
+    """Decode a websocket message carrying a JSON event.
+
+    :param message: Message read from the websocket.
+    :param codec: JSON codec to decode with.
+    :type  codec: codec.Codec
+    :return: The event, or None if this message isn't one.
+    """
+    if not isinstance(message, Message):
+        return None
+    try:
+        return codec.loads(message.data)
+    except ValueError:
+        log.warning("Could not decode event: %r", message.data)
+        return None
+
+
+class EventDispatcher(object):
+    """Routes websocket events to async handlers by their type.
+
+    Events are read and decoded by a single loop and handed to a fixed
+    pool of worker tasks through a bounded buffer. A slow handler thus
+    only holds up one worker; the socket is read as long as there is
+    room in the buffer, and reading pauses (instead of queueing without
+    limit) when all workers are busy and the buffer is full.
+
+    Handlers run concurrently, so events may be handled out of order
+    unless max_handlers is 1.
+
+    :param max_handlers: Number of handlers that may run at the same
+                         time.
+    :param buffer: Number of events to queue for busy handlers.
+    :param type_field: Name of the field holding an event's type.
+    :param codec: JSON codec for decoding events.
+    :type  codec: codec.Codec
+    """
+
+    def __init__(self, max_handlers=10, buffer=100, type_field='type',
+                 codec=json_codec.default):
+        self.max_handlers = max_handlers
+        self.codec = codec
+        self.buffer = buffer
+        self.type_field = type_field
+        self.handlers = {}
+
+    def __repr__(self):
+        return "%s(%s)" % (self.__class__.__name__, list(self.handlers))
+
+    def on(self, event_type, handler=None):
+        """Register a handler for an event type.
+
+        Can be used as a decorator::
+
+            @dispatcher.on('StasisStart')
+            async def start(event):
+                ...
+
+        :param event_type: Type of events to handle. None registers a
+                           handler for events that have no other handler.
+        :param handler: Async callable, invoked with the decoded event.
+        """
+        if handler is None:
+            def register(handler):
+                self.on(event_type, handler)
+                return handler
+            return register
+        # tuples, so that the dispatch loop can't see a half-updated list
+        self.handlers[event_type] = \
+            self.handlers.get(event_type, ()) + (handler,)
+        return handler
+
+    def off(self, event_type, handler):
+        """Remove a handler.
+
+        :param event_type: Type of events it was registered for.
+        :param handler: The handler to remove.
+        """
+        handlers = list(self.handlers.get(event_type, ()))
+        handlers.remove(handler)
+        if handlers:
+            self.handlers[event_type] = tuple(handlers)
+        else:
+            del self.handlers[event_type]
+
+    def decode(self, message):
+        """Decode a websocket message.
+
+        :param message: Message read from the websocket.
+        :return: The event, or None to skip this message.
+        """
+        return decode_message(message, self.codec)
+
+    def lookup(self, event):
+        """Returns the handlers for an event.
+
+        :param event: Decoded event.
+        """
+        try:
+            event_type = event[self.type_field]
+        except (KeyError, TypeError):
+            event_type = None
+        handlers = self.handlers.get(event_type)
+        if handlers is None:
+            handlers = self.handlers.get(None, ())
+        return handlers
+
+    async def dispatch(self, event):
+        """Run the handlers for an event, in the current task.
+
+        :param event: Decoded event.
+        """
+        for handler in self.lookup(event):
+            try:
+                await handler(event)
+            except Exception:
+                log.exception("Handler %r failed on %r", handler, event)
+
+    async def run(self, websocket):
+        """Read and dispatch events until the websocket is closed.
+
+        :param websocket: An open websocket, as returned by a websocket
+                          operation, or any async iterable of messages.
+        """
+        send, receive = anyio.create_memory_object_stream(self.buffer)
+        async with anyio.create_task_group() as tg:
+            with receive:
+                for _ in range(self.max_handlers):
+                    tg.start_soon(self._worker, receive.clone())
+            async with send:
+                async for message in websocket:
+                    event = self.decode(message)
+                    if event is not None:
+                        await send.send(event)
+
+    async def _worker(self, receive):
+        """Handle queued events.
+
+        :param receive: Receiving side of the event buffer.
+        """
+        async with receive:
+            async for event in receive:
+                await self.dispatch(event)
+
+
+class Subscription(object):
+    """A subscriber's view of a WebsocketMultiplexer.
+
+    Iterate over it to receive events. Events are shared between all
+    subscribers, so don't modify them.
+
+    :param multiplexer: The multiplexer to subscribe to.
+    :param filter: Called with each event; only events for which it
+                   returns True are delivered. None delivers all events.
+    :param overflow: What to do with an event when the buffer is full:
+                     BLOCK waits for room (holding up every other
+                     subscriber), DROP discards it.
+    :param buffer: Number of events buffered for this subscriber.
+    """
+
+    def __init__(self, multiplexer, filter=None, overflow=BLOCK, buffer=100):
+        if overflow not in (BLOCK, DROP):
+            raise ValueError("Unknown overflow policy %r" % (overflow,))
+        self.multiplexer = multiplexer
+        self.filter = filter
+        self.overflow = overflow
+        #: Number of events dropped because the buffer was full.
+        self.dropped = 0
+        self._send, self._receive = \
+            anyio.create_memory_object_stream(buffer)
+
+    def __repr__(self):
+        return "%s(%r)" % (self.__class__.__name__, self.multiplexer)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        self.close()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            return await self._receive.receive()
+        except (anyio.EndOfStream, anyio.ClosedResourceError):
+            raise StopAsyncIteration
+
+    def close(self):
+        """Stop receiving events."""
+        self.multiplexer.subscribers.discard(self)
+        self._send.close()
+        self._receive.close()
+
+    async def deliver(self, event):
+        """Queue an event for this subscriber, if it wants it.
+
+        :param event: Decoded event.
+        """
+        if self.filter is not None and not self.filter(event):
+            return
+        if self.overflow == DROP:
+            try:
+                self._send.send_nowait(event)
+            except anyio.WouldBlock:
+                self.dropped += 1
+        else:
+            await self._send.send(event)
+
+
+class WebsocketMultiplexer(object):
+    """Shares one websocket between any number of local subscribers.
+
+    The websocket is opened in supervised mode (see
+    http_client.SupervisedWebsocket) by run(), which must be started in
+    a long-lived task group. Each frame is decoded once and offered to
+    every subscriber.
+
+    Use AsynchronousHttpClient.ws_multiplex() or Operation.multiplex()
+    to get the multiplexer for a websocket, so that subscribers of the
+    same URL and parameters share one connection. The client forgets the
+    multiplexer when run() ends.
+
+    :param http_client: Client to connect with.
+    :type  http_client: http_client.AsynchronousHttpClient
+    :param url: WebSocket URL.
+    :param params: Query parameters.
+    :param headers: Extra HTTP headers, as a list of pairs.
+    """
+
+    def __init__(self, http_client, url, params=None, headers=None):
+        self.http_client = http_client
+        self.url = url
+        self.params = params
+        self.headers = headers
+        self.subscribers = set()
+        self.websocket = None
+        #: Key in http_client.multiplexers, if registered there.
+        self.key = None
+
+    def __repr__(self):
+        return "%s(%s)" % (self.__class__.__name__, self.url)
+
+    def subscribe(self, filter=None, overflow=BLOCK, buffer=100):
+        """Subscribe to the websocket's events.
+
+        See Subscription for the arguments.
+
+        :rtype: Subscription
+        """
+        subscription = Subscription(self, filter=filter, overflow=overflow,
+                                    buffer=buffer)
+        self.subscribers.add(subscription)
+        return subscription
+
+    async def run(self, task_status=anyio.TASK_STATUS_IGNORED):
+        """Read the websocket and distribute its events.
+
+        Runs until cancelled. All subscriptions are closed afterwards.
+        """
+        if self.websocket is not None:
+            raise RuntimeError("%r is already running" % (self,))
+        self.websocket = self.http_client.ws_supervise(
+            self.url, params=self.params, headers=self.headers)
+        codec = self.http_client.codec
+        try:
+            async with self.websocket as websocket:
+                task_status.started()
+                async for message in websocket:
+                    event = decode_message(message, codec)
+                    if event is None:
+                        continue
+                    for subscription in tuple(self.subscribers):
+                        try:
+                            await subscription.deliver(event)
+                        except (anyio.BrokenResourceError,
+                                anyio.ClosedResourceError):
+                            subscription.close()
+        finally:
+            self.websocket = None
+            multiplexers = self.http_client.multiplexers
+            if self.key is not None and multiplexers.get(self.key) is self:
+                del multiplexers[self.key]
+            for subscription in tuple(self.subscribers):
+                subscription.close()
@@ -9,17 +9,39 @@
 """HTTP client abstractions.
 """
 
+import contextlib
 import logging
+import random
 import urllib.parse
+import anyio
 import httpx
 import base64
-import json
+import os
 from asyncwebsockets import create_websocket
+from wsproto.events import Ping, Pong
 
 from http import HTTPStatus
 
+from asyncswagger11 import codec as json_codec
+
 log = logging.getLogger(__name__)
 
+#: Default connection pool limits, see AsynchronousHttpClient.
+DEFAULT_MAX_CONNECTIONS = 100
+DEFAULT_MAX_KEEPALIVE_CONNECTIONS = 20
+DEFAULT_KEEPALIVE_EXPIRY = 5.0
+DEFAULT_TIMEOUT = 600
+
+#: Default time limit for retrying a request, see RetryPolicy.
+DEFAULT_RETRY_DEADLINE = 60
+
+#: Methods that may safely be sent more than once.
+IDEMPOTENT_METHODS = frozenset(
+    ('GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE', 'TRACE'))
+
+#: Errors that guarantee that the request has not been sent.
+UNSENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
 error_map = {}
 for k,v in HTTPStatus.__members__.items():
     error_map[v] = k
@@ -28,6 +50,9 @@ class HttpClient(object):
     """Interface for a minimal HTTP client.
     """
 
+    #: JSON codec for bodies and responses.
+    codec = json_codec.default
+
     def close(self):
         """Close this client resource.
         """
@@ -57,7 +82,8 @@ class HttpClient(object):
             "%s: Method not implemented", self.__class__.__name__)
 
 
-    def request(self, method, url, params=None, data=None):
+    def request(self, method, url, params=None, data=None, headers=None,
+                operation=None):
         """Issue an HTTP request.
 
         :param method: HTTP method (GET, POST, DELETE, etc.)
@@ -68,6 +94,9 @@ class HttpClient(object):
         :type  params: dict
         :param data: Request body
         :type  data: Dictionary, bytes, or file-like object
+        :param headers: Extra HTTP headers
+        :type  headers: dict
+        :param operation: Nickname of the Swagger operation, if any.
         :return: Implementation specific response object
         """
         raise NotImplementedError(
@@ -152,12 +181,693 @@ class ApiKeyAuthenticator(Authenticator):
         params[self.param_name] = self.api_key
 
 
+class RetryBudget(object):
+    """Limits retries to a fraction of the requests made.
+
+    Every request deposits ``ratio`` tokens, every retry withdraws one.
+    The balance is capped at ``reserve``, which is also the initial
+    balance. Thus a failing server sees at most ``ratio`` times more
+    traffic, instead of ``retries`` times more.
+
+    :param ratio: Tokens deposited per request.
+    :param reserve: Maximum (and initial) balance.
+    """
+
+    def __init__(self, ratio=0.2, reserve=10):
+        self.ratio = ratio
+        self.reserve = reserve
+        self.balance = float(reserve)
+
+    def __repr__(self):
+        return "%s(%.1f)" % (self.__class__.__name__, self.balance)
+
+    def deposit(self):
+        """Record a request."""
+        self.balance = min(self.reserve, self.balance + self.ratio)
+
+    def withdraw(self):
+        """Try to take a token for a retry.
+
+        :return: True if the retry may proceed, False otherwise.
+        """
+        if self.balance < 1:
+            return False
+        self.balance -= 1
+        return True
+
+
+class RetryPolicy(object):
+    """Decides whether and when a failed request is retried.
+
+    Only transport errors are retried, and only if the request is
+    idempotent or has not been sent at all; in particular, a read
+    timeout is never retried for a non-idempotent request. Delays grow
+    exponentially, with full jitter.
+
+    No retry is started once deadline seconds have passed since the
+    first attempt, and retries are sent with their timeouts cut to the
+    time that is left. A request thus takes at most its first attempt
+    or the deadline, whichever is longer.
+
+    :param retries: Maximum number of retries per request.
+    :param backoff: Delay limit for the first retry.
+    :param max_backoff: Upper bound for any delay.
+    :param budget: Budget shared by all requests; a new default budget
+                   if not given.
+    :type  budget: RetryBudget
+    :param deadline: Time limit for all retries of a request, in
+                     seconds. None for no limit.
+    """
+
+    def __init__(self, retries=2, backoff=0.05, max_backoff=2.0, budget=None,
+                 deadline=DEFAULT_RETRY_DEADLINE):
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.deadline = deadline
+        if budget is None:
+            budget = RetryBudget()
+        self.budget = budget
+
+    def __repr__(self):
+        return "%s(%d)" % (self.__class__.__name__, self.retries)
+
+    def should_retry(self, method, error, attempt, elapsed=0):
+        """Check whether to retry a request.
+
+        :param method: HTTP method of the request.
+        :param error: The error that occurred.
+        :param attempt: Number of retries so far.
+        :param elapsed: Seconds since the first attempt was started.
+        :return: True if the request should be retried.
+        """
+        if attempt >= self.retries:
+            return False
+        if self.deadline is not None and elapsed >= self.deadline:
+            return False
+        if not isinstance(error, httpx.TransportError):
+            return False
+        if method.upper() not in IDEMPOTENT_METHODS and \
+                (isinstance(error, httpx.ReadTimeout) or
+                 not isinstance(error, UNSENT_ERRORS)):
+            return False
+        return self.budget.withdraw()
+
+    def timeout(self, timeout, elapsed):
+        """Returns the timeouts for a retry.
+
+        :param timeout: The client's timeouts.
+        :type  timeout: httpx.Timeout
+        :param elapsed: Seconds since the first attempt was started.
+        :return: timeout, with every phase limited to the time left
+                 until the deadline.
+        :rtype: httpx.Timeout
+        """
+        if self.deadline is None:
+            return timeout
+        left = max(0.001, self.deadline - elapsed)
+
+        def _cap(value):
+            return left if value is None else min(value, left)
+
+        return httpx.Timeout(
+            connect=_cap(timeout.connect), read=_cap(timeout.read),
+            write=_cap(timeout.write), pool=_cap(timeout.pool))
+
+    def delay(self, attempt):
+        """Returns the time to wait before a retry.
+
+        :param attempt: Number of retries so far.
+        """
+        return random.uniform(
+            0, min(self.max_backoff, self.backoff * (2 ** attempt)))
+
+
+class RateLimit(object):
+    """Admission control: a token bucket plus a concurrency limit.
+
+    Use it as an async context manager around a request. Requests wait
+    in FIFO order until a token is available and fewer than concurrency
+    requests are running; they are never rejected.
+
+    :param rate: Tokens added per second. None for no rate limit.
+    :param burst: Maximum number of tokens, i.e. requests that may be
+                  sent at once after an idle period.
+    :param concurrency: Maximum number of requests in flight. None for
+                        no limit.
+    """
+
+    def __init__(self, rate=None, burst=1, concurrency=None):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = None
+        self.lock = anyio.Lock()
+        self.limiter = anyio.CapacityLimiter(concurrency) \
+            if concurrency else None
+
+    def __repr__(self):
+        return "%s(rate=%r, burst=%r, concurrency=%r)" % (
+            self.__class__.__name__, self.rate, self.burst,
+            self.limiter.total_tokens if self.limiter else None)
+
+    async def __aenter__(self):
+        if self.rate:
+            await self.take()
+        if self.limiter is not None:
+            await self.limiter.acquire()
+        return self
+
+    async def __aexit__(self, *exc):
+        if self.limiter is not None:
+            self.limiter.release()
+
+    async def take(self):
+        """Wait for a token and take it."""
+        async with self.lock:
+            self.refill()
+            if self.tokens < 1:
+                await anyio.sleep((1 - self.tokens) / self.rate)
+                self.refill()
+            self.tokens -= 1
+
+    def refill(self):
+        now = anyio.current_time()
+        if self.updated is not None:
+            self.tokens = min(self.burst, self.tokens +
+                              (now - self.updated) * self.rate)
+        self.updated = now
+
+    @property
+    def waiting(self):
+        """Number of requests queued for a token or a slot."""
+        waiting = self.lock.statistics().tasks_waiting
+        if self.limiter is not None:
+            waiting += self.limiter.statistics().tasks_waiting
+        return waiting
+
+
+class CircuitOpenError(ConnectionError):
+    """A request was refused because the host's circuit is open.
+
+    :param host: The host.
+    :param retry_after: Seconds until the circuit lets a probe through.
+    """
+
+    def __init__(self, host, retry_after):
+        super().__init__("Circuit for %s is open, retry in %.1fs" %
+                         (host, retry_after))
+        self.host = host
+        self.retry_after = retry_after
+
+
+class CircuitBreaker(object):
+    """Fails requests to a host fast while it appears to be down.
+
+    The circuit opens after failure_threshold consecutive failures
+    (transport errors, or 5xx responses). While it is open, requests
+    raise CircuitOpenError without being sent. After recovery_time, it
+    is half open: up to probes requests are let through, and if they all
+    succeed the circuit closes again; any failure re-opens it.
+
+    :param host: The host this circuit protects.
+    :param failure_threshold: Consecutive failures that open the circuit.
+    :param recovery_time: Seconds to wait before probing the host.
+    :param probes: Number of successful probes needed to close it.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, host, failure_threshold=5, recovery_time=30,
+                 probes=1):
+        self.host = host
+        self.failure_threshold = failure_threshold
+        self.recovery_time = recovery_time
+        self.probes = probes
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened = None
+        self.in_flight = 0
+        self.probing = 0
+        self.successes = 0
+        #: Number of times the circuit has opened.
+        self.trips = 0
+        #: Number of requests refused while open.
+        self.refused = 0
+
+    def __repr__(self):
+        return "%s(%s, %s)" % (self.__class__.__name__, self.host,
+                               self.state)
+
+    def before(self):
+        """Admit a request, or raise CircuitOpenError.
+
+        Every admitted request must be followed by exactly one call to
+        success(), failure() or release(), passing on what this
+        returned. Only probes can close or re-open a half open circuit;
+        the verdict of a request admitted before the circuit opened only
+        counts while it is closed.
+
+        :return: True if the request is a probe of a half open circuit.
+        """
+        if self.state == self.OPEN:
+            waited = anyio.current_time() - self.opened
+            if waited < self.recovery_time:
+                self.refused += 1
+                raise CircuitOpenError(self.host,
+                                       self.recovery_time - waited)
+            log.info("Circuit for %s is half open", self.host)
+            self.state = self.HALF_OPEN
+            self.probing = 0
+            self.successes = 0
+        probe = self.state == self.HALF_OPEN
+        if probe:
+            if self.probing >= self.probes:
+                self.refused += 1
+                raise CircuitOpenError(self.host, 0)
+            self.probing += 1
+        self.in_flight += 1
+        return probe
+
+    def _end_probe(self, probe):
+        """Returns True if probe is a probe of the current half open
+        state, and frees its slot."""
+        if not probe or self.state != self.HALF_OPEN or not self.probing:
+            return False
+        self.probing -= 1
+        return True
+
+    def release(self, probe=False):
+        """An admitted request ended without a verdict, e.g. cancelled.
+
+        :param probe: What before() returned.
+        """
+        self.in_flight -= 1
+        self._end_probe(probe)
+
+    def success(self, probe=False):
+        """An admitted request succeeded.
+
+        :param probe: What before() returned.
+        """
+        self.in_flight -= 1
+        if self._end_probe(probe):
+            self.successes += 1
+            if self.successes >= self.probes:
+                log.info("Circuit for %s is closed", self.host)
+                self.state = self.CLOSED
+                self.failures = 0
+        elif self.state == self.CLOSED:
+            self.failures = 0
+
+    def failure(self, probe=False):
+        """An admitted request failed.
+
+        :param probe: What before() returned.
+        """
+        self.in_flight -= 1
+        if self._end_probe(probe):
+            self.failures += 1
+            self.open()
+        elif self.state == self.CLOSED:
+            self.failures += 1
+            if self.failures >= self.failure_threshold:
+                self.open()
+
+    def open(self):
+        """Open the circuit."""
+        log.warning("Circuit for %s is open after %d failures",
+                    self.host, self.failures)
+        self.trips += 1
+        self.state = self.OPEN
+        self.opened = anyio.current_time()
+        self.probing = 0
+
+    @property
+    def stats(self):
+        """State of the circuit, for monitoring."""
+        return {
+            'state': self.state,
+            'failures': self.failures,
+            'trips': self.trips,
+            'refused': self.refused,
+            'in_flight': self.in_flight,
+        }
+
+
+async def ws_send_event(websocket, event):
+    """Send a wsproto control event (ping, pong) on a websocket.
+
+    asyncwebsockets has no public API for this: it passes pings to the
+    reader instead of answering them, and cannot send one. This uses its
+    connection internals, which tests/http_client_test.py checks against
+    a real asyncwebsockets server.
+
+    :param websocket: asyncwebsockets connection.
+    :param event: wsproto event to send.
+    """
+    async with websocket._send_lock:
+        await websocket._sock.send(websocket._connection.send(event))
+
+
+class TrackedWebsocket(object):
+    """A websocket connection registered with its AsynchronousHttpClient.
+
+    It unregisters itself when it is closed or when the server ends the
+    connection, so the client only tracks live connections. Until then,
+    the registry keeps it alive, so that closing the client closes a
+    connection that was abandoned without being closed. Anything else is
+    passed through to the asyncwebsockets connection.
+
+    Use it as an async context manager to close it when done.
+
+    :param websockets: Registry of open connections.
+    :type  websockets: set
+    :param websocket: asyncwebsockets connection.
+    :param metrics: Counts the messages, if set.
+    :type  metrics: metrics.Metrics
+    :param path: URL path to count the messages under.
+    """
+
+    def __init__(self, websockets, websocket, metrics=None, path=None):
+        self._websockets = websockets
+        self._websocket = websocket
+        self._metrics = metrics
+        self._path = path
+        websockets.add(self)
+
+    def __getattr__(self, item):
+        return getattr(self._websocket, item)
+
+    def __repr__(self):
+        return "%s(%r)" % (self.__class__.__name__, self._websocket)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def __aiter__(self):
+        metrics = self._metrics
+        messages = self._websocket.__aiter__()
+        try:
+            if metrics is None:
+                async for message in messages:
+                    yield message
+            else:
+                counts, path = metrics.ws_received, self._path
+                async for message in messages:
+                    counts[path] = counts.get(path, 0) + 1
+                    yield message
+        finally:
+            # Finishes the connection's iterator; the connection stays open
+            aclose = getattr(messages, 'aclose', None)
+            if aclose is not None:
+                await aclose()
+        # Only the server ended it: a consumer that stops iterating
+        # leaves the connection open, and registered until closed.
+        self._websockets.discard(self)
+
+    async def send(self, data):
+        """Send a message.
+
+        :param data: Message to send.
+        :type  data: str or bytes
+        """
+        await self._websocket.send(data)
+        if self._metrics is not None:
+            counts = self._metrics.ws_sent
+            counts[self._path] = counts.get(self._path, 0) + 1
+
+    async def close(self, *args, **kwargs):
+        """Close the connection.
+
+        Arguments are passed to the asyncwebsockets connection.
+        """
+        self._websockets.discard(self)
+        await self._websocket.close(*args, **kwargs)
+
+
+class SupervisedWebsocket(object):
+    """A websocket that survives connection loss.
+
+    The connection is opened, watched and re-opened by a background
+    task while this object is used as an async context manager::
+
+        async with http_client.ws_supervise(url, params) as ws:
+            async for message in ws:
+                ...
+
+    Messages are passed through a bounded queue, so that consumers keep
+    iterating across reconnects. When the queue is full, the socket is
+    not read until there is room again.
+
+    An idle connection is pinged; if nothing arrives within
+    ping_timeout after that, the connection is considered dead. Failed
+    connections are retried with jittered exponential backoff, using
+    the same URL, parameters and authentication.
+
+    The attributes may be changed before the context is entered.
+
+    :param http_client: Client to connect with.
+    :type  http_client: AsynchronousHttpClient
+    :param url: WebSocket URL.
+    :param params: Query parameters.
+    :param headers: Extra HTTP headers, as a list of pairs.
+    """
+
+    queue_size = 1000
+    ping_interval = 20
+    ping_timeout = 10
+    backoff = 0.5
+    max_backoff = 30
+
+    def __init__(self, http_client, url, params=None, headers=None):
+        self.http_client = http_client
+        self.url = url
+        self.params = params or {}
+        self.headers = headers
+        self.websocket = None
+        #: Number of times the connection has been re-established.
+        self.reconnects = 0
+        #: Total time without a connection, not counting the current outage
+        #: nor the time before the first connection.
+        self.downtime = 0.0
+        self._down_since = None
+        self._last_seen = 0
+        self._blocked = False
+        self._tg = None
+        self._send = self._receive = None
+
+    def __repr__(self):
+        return "%s(%s)" % (self.__class__.__name__, self.url)
+
+    @property
+    def connected(self):
+        """True if the websocket is currently connected."""
+        return self.websocket is not None
+
+    @property
+    def stats(self):
+        """Returns connection metrics.
+
+        :return: dict with 'connected', 'reconnects', 'downtime' (in
+                 seconds, including any current outage) and 'queued'.
+        """
+        downtime = self.downtime
+        if self._down_since is not None:
+            downtime += anyio.current_time() - self._down_since
+        return {
+            'connected': self.connected,
+            'reconnects': self.reconnects,
+            'downtime': downtime,
+            'queued': self._receive.statistics().current_buffer_used
+                      if self._receive is not None else 0,
+        }
+
+    async def __aenter__(self):
+        self._send, self._receive = \
+            anyio.create_memory_object_stream(self.queue_size)
+        self._tg = anyio.create_task_group()
+        await self._tg.__aenter__()
+        self._tg.start_soon(self._supervise)
+        return self
+
+    async def __aexit__(self, *exc):
+        self._tg.cancel_scope.cancel()
+        try:
+            return await self._tg.__aexit__(*exc)
+        finally:
+            self._receive.close()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            return await self._receive.receive()
+        except (anyio.EndOfStream, anyio.ClosedResourceError):
+            raise StopAsyncIteration
+
+    async def receive(self):
+        """Returns the next message, waiting for a connection if needed.
+        """
+        return await self._receive.receive()
+
+    async def send(self, data):
+        """Send a message.
+
+        :param data: Message to send.
+        :type  data: str or bytes
+        :raise: ConnectionError: if the websocket is not connected.
+        """
+        websocket = self.websocket
+        if websocket is None:
+            raise ConnectionError("%r is not connected" % (self,))
+        await websocket.send(data)
+
+    async def _supervise(self):
+        """Keep the websocket connected."""
+        attempt = 0
+        was_connected = False
+        async with self._send:
+            while True:
+                try:
+                    websocket = await self.http_client.ws_connect(
+                        self.url, params=dict(self.params),
+                        headers=self.headers)
+                except Exception as err:
+                    delay = random.uniform(0, min(
+                        self.max_backoff, self.backoff * (2 ** attempt)))
+                    log.warning("Connecting to %s failed (%r), retrying in "
+                                "%.1fs", self.url, err, delay)
+                    attempt += 1
+                    await anyio.sleep(delay)
+                    continue
+
+                attempt = 0
+                if was_connected:
+                    self.reconnects += 1
+                    self.downtime += anyio.current_time() - self._down_since
+                    self._down_since = None
+                was_connected = True
+                self.websocket = websocket
+                try:
+                    await self._pump(websocket)
+                except Exception as err:
+                    log.warning("Websocket %s failed: %r", self.url, err)
+                finally:
+                    self.websocket = None
+                    self._down_since = anyio.current_time()
+                    with anyio.CancelScope(shield=True):
+                        await websocket.close()
+                log.info("Websocket %s lost, reconnecting", self.url)
+
+    async def _pump(self, websocket):
+        """Move messages from the websocket to the queue.
+
+        :param websocket: The current connection.
+        """
+        self._last_seen = anyio.current_time()
+        async with anyio.create_task_group() as tg:
+            tg.start_soon(self._heartbeat, websocket, tg.cancel_scope)
+            async for message in websocket:
+                self._last_seen = anyio.current_time()
+                if isinstance(message, Ping):
+                    await ws_send_event(websocket, message.response())
+                elif not isinstance(message, Pong):
+                    self._blocked = True
+                    try:
+                        await self._send.send(message)
+                    finally:
+                        self._blocked = False
+            tg.cancel_scope.cancel()
+
+    async def _heartbeat(self, websocket, scope):
+        """Ping an idle connection, and drop it if it doesn't answer.
+
+        :param websocket: The current connection.
+        :param scope: Cancelled when the connection is dead.
+        """
+        while True:
+            await anyio.sleep(self.ping_interval)
+            idle = anyio.current_time() - self._last_seen
+            if self._blocked or idle < self.ping_interval:
+                continue
+            sent = anyio.current_time()
+            await ws_send_event(websocket, Ping(os.urandom(4)))
+            await anyio.sleep(self.ping_timeout)
+            if not self._blocked and self._last_seen < sent:
+                log.warning("Websocket %s timed out", self.url)
+                scope.cancel()
+                return
+
+
 # noinspection PyDocstring
 class AsynchronousHttpClient(HttpClient):
     """Asynchronous HTTP client implementation.
+
+    Timeouts are in seconds. The per-phase timeouts default to the
+    overall timeout.
+
+    Several clients (for instance, with different credentials) may share
+    one connection pool by passing the session of the first one to the
+    others. A shared session is not closed by the clients using it.
+
+    :param username: User name for HTTP Basic authentication.
+    :param password: Password for HTTP Basic authentication.
+    :param auth: Authenticator; exclusive with username+password.
+    :type  auth: Authenticator
+    :param max_connections: Maximum number of open connections.
+    :param max_keepalive_connections: Maximum number of idle connections
+                                      kept open for re-use.
+    :param keepalive_expiry: Time after which idle connections are
+                             closed.
+    :param timeout: Default timeout.
+    :param connect_timeout: Timeout for establishing a connection.
+    :param read_timeout: Timeout for receiving data.
+    :param write_timeout: Timeout for sending data.
+    :param pool_timeout: Timeout for getting a connection from the pool.
+    :param http2: Use HTTP/2 where the server supports it. This requires
+                  the 'h2' package.
+    :param session: Use this existing connection pool. The pool
+                    arguments are ignored if it is set.
+    :type  session: httpx.AsyncClient
+    :param retry: Retry policy for failed requests. Defaults to a new
+                  RetryPolicy(); use RetryPolicy(retries=0) to disable.
+    :type  retry: RetryPolicy
+    :param codec: JSON codec, or the name of one. Defaults to the fastest
+                  one installed.
+    :type  codec: codec.Codec or str
+    :param host_limit: Keyword arguments of a RateLimit applied to each
+                       host separately, e.g. dict(rate=50, burst=10,
+                       concurrency=20).
+    :type  host_limit: dict
+    :param operation_limits: RateLimit arguments by operation nickname,
+                             applied per host in addition to
+                             host_limit.
+    :type  operation_limits: dict
+    :param circuit_breaker: Keyword arguments of a CircuitBreaker for
+                            each host, e.g. dict(failure_threshold=5,
+                            recovery_time=30). None disables them.
+    :type  circuit_breaker: dict
+    :param metrics: Record request latency, status codes and websocket
+                    messages here. None records nothing.
+    :type  metrics: metrics.Metrics
     """
 
-    def __init__(self, username='', password='', auth=None):
+    def __init__(self, username='', password='', auth=None,
+                 max_connections=DEFAULT_MAX_CONNECTIONS,
+                 max_keepalive_connections=DEFAULT_MAX_KEEPALIVE_CONNECTIONS,
+                 keepalive_expiry=DEFAULT_KEEPALIVE_EXPIRY,
+                 timeout=DEFAULT_TIMEOUT, connect_timeout=None,
+                 read_timeout=None, write_timeout=None, pool_timeout=None,
+                 http2=False, session=None, retry=None, codec=None,
+                 host_limit=None, operation_limits=None,
+                 circuit_breaker=None, metrics=None):
         if auth is None:
             if username or password:
                 auth = BasicAuthenticator(None, username, password)
@@ -166,8 +876,42 @@ class AsynchronousHttpClient(HttpClient):
                 " use user+pass or auth, not both")
         self.authenticator = auth
         self.websockets = set()
-        limits = httpx.Limits(max_keepalive_connections=1, max_connections=3)
-        self.session = httpx.AsyncClient(timeout=600, limits=limits)
+        self.multiplexers = {}
+        self.host_limit = host_limit
+        self.operation_limits = operation_limits or {}
+        self.rate_limits = {}
+        self.circuit_breaker = circuit_breaker
+        self.circuits = {}
+        self.metrics = metrics
+        if retry is None:
+            retry = RetryPolicy()
+        self.retry = retry
+        if isinstance(codec, str):
+            codec = json_codec.get_codec(codec)
+        if codec is not None:
+            self.codec = codec
+        if session is not None:
+            self.session = session
+            self.owns_session = False
+            #: Size of the connection pool; None if it is not known.
+            self.max_connections = None
+            return
+
+        def _phase(value):
+            return timeout if value is None else value
+
+        limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry)
+        timeouts = httpx.Timeout(
+            timeout, connect=_phase(connect_timeout),
+            read=_phase(read_timeout), write=_phase(write_timeout),
+            pool=_phase(pool_timeout))
+        self.session = httpx.AsyncClient(
+            timeout=timeouts, limits=limits, http2=http2)
+        self.owns_session = True
+        self.max_connections = max_connections
 
     def set_basic_auth(self, host, username, password):
         self.authenticator = BasicAuthenticator(
@@ -178,15 +922,86 @@ class AsynchronousHttpClient(HttpClient):
             host=host, api_key=api_key, param_name=param_name)
 
     async def close(self):
-        for websocket in self.websockets:
-            await websocket.close()
-        await self.session.aclose()
+        async with anyio.create_task_group() as tg:
+            for websocket in list(self.websockets):
+                tg.start_soon(websocket.close)
+        if self.owns_session:
+            await self.session.aclose()
+
+    def limits_for(self, url, operation=None):
+        """Returns the RateLimits that apply to a request.
 
-    async def request(self, method, url, params=None, data=None, headers=None):
+        :param url: URL to request.
+        :param operation: Nickname of the Swagger operation, if any.
+        :rtype: list of RateLimit
+        """
+        if self.host_limit is None and operation not in self.operation_limits:
+            return []
+        host = urllib.parse.urlsplit(url).netloc
+        limits = []
+        for name, args in ((operation, self.operation_limits.get(operation)),
+                           (None, self.host_limit)):
+            if args is None:
+                continue
+            try:
+                limit = self.rate_limits[host, name]
+            except KeyError:
+                limit = self.rate_limits[host, name] = RateLimit(**args)
+            limits.append(limit)
+        return limits
+
+    def circuit_for(self, url):
+        """Returns the CircuitBreaker of a URL's host.
+
+        :param url: URL to request.
+        :return: The circuit, or None if circuit breakers are disabled.
+        """
+        if self.circuit_breaker is None:
+            return None
+        host = urllib.parse.urlsplit(url).netloc
+        try:
+            return self.circuits[host]
+        except KeyError:
+            circuit = self.circuits[host] = \
+                CircuitBreaker(host, **self.circuit_breaker)
+            return circuit
+
+    async def request(self, method, url, params=None, data=None, headers=None,
+                      operation=None):
         """Requests based implementation.
+
+        Encoded bodies (bytes or str) are sent as they are, anything else
+        as form data. Every attempt waits for the rate limits configured
+        for the host and operation, see limits_for(), and is refused
+        with CircuitOpenError if the host's circuit is open.
+
         :return: httpx response
         :rtype:  httpx.Response
         """
+        metrics = self.metrics
+        if metrics is None:
+            return await self._request(method, url, params, data, headers,
+                                       operation, None)
+        started = metrics.request_started(operation)
+        status = None
+        try:
+            response = await self._request(method, url, params, data,
+                                           headers, operation, metrics)
+            status = response.status_code
+            return response
+        except Exception as err:
+            status = getattr(getattr(err, 'response', None),
+                             'status_code', None)
+            raise
+        finally:
+            metrics.request_finished(operation, started, status)
+
+    async def _request(self, method, url, params, data, headers, operation,
+                       metrics):
+        """Send a request, see request().
+
+        :param metrics: Records the wait for a connection, if set.
+        """
         if self.authenticator is not None and \
             self.authenticator.matches(url):
             if params is None:
@@ -195,21 +1010,45 @@ class AsynchronousHttpClient(HttpClient):
                 headers = {}
             self.authenticator.apply(headers, params)
 
-        # The socket might be closed … so just retry.
-        try:
-            response = await self.session.request(
-                method=method, url=url, params=params, data=data, headers=headers)
-        except httpx.HTTPError:
-            await self.session.aclose()  # this flushes any open connections
-            response = await self.session.request(
-                method=method, url=url, params=params, data=data, headers=headers)
+        # The pool drops a broken connection by itself, so a retry
+        # simply gets a new one.
+        content = None
+        if isinstance(data, (bytes, str)):
+            content, data = data, None
+
+        limits = self.limits_for(url, operation)
+        circuit = self.circuit_for(url)
+        retry = self.retry
+        retry.budget.deposit()
+        attempt = 0
+        started = anyio.current_time()
+        args = dict(method=method, url=url, params=params, data=data,
+                    content=content, headers=headers)
+        while True:
+            if metrics is not None:
+                args['extensions'] = {'trace': metrics.pool_timer()}
+            try:
+                response = await self._attempt(args, limits, circuit)
+            except httpx.TransportError as err:
+                elapsed = anyio.current_time() - started
+                if not retry.should_retry(method, err, attempt, elapsed):
+                    raise
+                delay = retry.delay(attempt)
+                if log.isEnabledFor(logging.DEBUG):
+                    log.debug("%s %s failed (%r), retrying in %.3fs",
+                              method, url, err, delay)
+                await anyio.sleep(delay)
+                attempt += 1
+                args['timeout'] = retry.timeout(
+                    self.session.timeout, anyio.current_time() - started)
+            else:
+                break
 
         if response.status_code >= 400:
-            text = response.text
             data = None
             if response.status_code == 400:
                 try:
-                    data = json.loads(text)
+                    data = self.codec.loads(response.content)
                 except Exception:
                     pass
             try:
@@ -219,16 +1058,51 @@ class AsynchronousHttpClient(HttpClient):
                 raise
         return response
 
+    async def _attempt(self, args, limits, circuit):
+        """Send a request once.
+
+        The circuit is asked for admission only after the rate limits
+        have let the request through, so that queued requests don't hold
+        the probe slots of a half open circuit.
+
+        :param args: Arguments for the session's request().
+        :param limits: RateLimits to wait for.
+        :param circuit: CircuitBreaker of the host, or None.
+        :rtype: httpx.Response
+        """
+        if limits:
+            async with contextlib.AsyncExitStack() as stack:
+                for limit in limits:
+                    await stack.enter_async_context(limit)
+                return await self._attempt(args, (), circuit)
+        if circuit is None:
+            return await self.session.request(**args)
+        probe = circuit.before()
+        try:
+            response = await self.session.request(**args)
+        except httpx.TransportError:
+            circuit.failure(probe)
+            raise
+        except BaseException:
+            circuit.release(probe)
+            raise
+        if response.status_code >= 500:
+            circuit.failure(probe)
+        else:
+            circuit.success(probe)
+        return response
+
     async def ws_connect(self, url, params=None, headers=None):
         """Websocket-client based implementation.
         :return: asyncwebsockets connection
-        :rtype:  asyncwebsockets.ClientWebsocket
+        :rtype:  TrackedWebsocket
         """
         if params is None:
             params = {}
         if self.authenticator is not None and \
             self.authenticator.matches(url):
             self.authenticator.apply(params, params)
+        path = urllib.parse.urlsplit(url).path
 
         if params:
             joined_params = "&".join(["%s=%s" % (k, v)
@@ -236,6 +1110,40 @@ class AsynchronousHttpClient(HttpClient):
             url += "?%s" % joined_params
         # ret = await self.session.ws_connect(url)
         ret = await create_websocket(url, headers=headers)
-        self.websockets.add(ret)
-        return ret
+        return TrackedWebsocket(self.websockets, ret, self.metrics, path)
+
+    def ws_supervise(self, url, params=None, headers=None):
+        """Create a websocket that reconnects when it is lost.
 
+        :param url: WebSocket URL.
+        :param params: Query parameters (?key=value)
+        :param headers: Extra HTTP headers, as a list of pairs.
+        :rtype: SupervisedWebsocket
+        """
+        return SupervisedWebsocket(self, url, params=params, headers=headers)
+
+    def ws_multiplex(self, url, params=None, headers=None):
+        """Get the shared multiplexer for a websocket.
+
+        All callers asking for the same URL and parameters get the same
+        multiplexer, and thus share a single connection, until its run()
+        ends; after that, they get a new one.
+
+        :param url: WebSocket URL.
+        :param params: Query parameters (?key=value)
+        :param headers: Extra HTTP headers, as a list of pairs; only
+                        used by the first caller.
+        :rtype: events.WebsocketMultiplexer
+        """
+        from asyncswagger11.events import WebsocketMultiplexer
+
+        key = (url, tuple(sorted((params or {}).items())))
+        try:
+            return self.multiplexers[key]
+        except KeyError:
+            pass
+        multiplexer = WebsocketMultiplexer(self, url, params=params,
+                                           headers=headers)
+        multiplexer.key = key
+        self.multiplexers[key] = multiplexer
+        return multiplexer
@@ -0,0 +1,271 @@
+#!/usr/bin/env python
+
+#
+# Copyright (c) 2018, Matthias Urlichs
+#
+
+"""Request metrics of an HTTP client.
+
+Pass a Metrics object to the client to have it record the latency and
+status of every request, by operation nickname, the number of requests
+in flight, the time spent waiting for a connection, and websocket
+message counts::
+
+    metrics = Metrics()
+    async with SwaggerClient(url, metrics=metrics) as client:
+        ...
+        text = metrics.prometheus()
+
+Latencies are counted in fixed buckets, so recording a request costs
+a few integer increments no matter how many have been recorded. Without
+a Metrics object the client records nothing.
+"""
+
+import bisect
+import math
+import time
+
+#: Bucket upper bounds in seconds; larger values go into an overflow
+#: bucket.
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram(object):
+    """Counts of observed values in fixed buckets.
+
+    :param bounds: Ascending upper bounds of the buckets.
+    """
+
+    __slots__ = ('bounds', 'counts', 'sum')
+
+    def __init__(self, bounds=DEFAULT_BUCKETS):
+        self.bounds = tuple(bounds)
+        #: One count per bound, plus one for larger values.
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.sum = 0.0
+
+    def __repr__(self):
+        return "%s(%d values)" % (self.__class__.__name__, self.count)
+
+    def observe(self, value):
+        """Record a value.
+
+        :param value: The value, e.g. a duration in seconds.
+        """
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+    @property
+    def count(self):
+        """Number of values recorded."""
+        return sum(self.counts)
+
+    def cumulative(self):
+        """Returns (upper bound, count of values <= bound) pairs.
+
+        The last bound is infinity.
+        """
+        ret = []
+        total = 0
+        for bound, count in zip(self.bounds + (math.inf,), self.counts):
+            total += count
+            ret.append((bound, total))
+        return ret
+
+    def snapshot(self):
+        """Returns the histogram as plain data."""
+        return {
+            'buckets': self.cumulative(),
+            'count': self.count,
+            'sum': self.sum,
+        }
+
+
+class PoolTimer(object):
+    """httpx trace callback recording the wait for a connection.
+
+    httpx reports the first step of a request once it has a connection,
+    new or re-used; the time until then is recorded.
+
+    :param histogram: Records the waiting time.
+    :param started: When the request started waiting.
+    """
+
+    __slots__ = ('histogram', 'started')
+
+    def __init__(self, histogram, started):
+        self.histogram = histogram
+        self.started = started
+
+    async def __call__(self, event, info):
+        if self.started is not None and event.endswith('.started'):
+            self.histogram.observe(time.monotonic() - self.started)
+            self.started = None
+
+
+class Metrics(object):
+    """Metrics collected by AsynchronousHttpClient.
+
+    Requests that are not Swagger operations, e.g. loading the API, are
+    recorded under the operation None.
+
+    :param buckets: Bucket upper bounds of the latency histograms, in
+                    seconds.
+    :param prefix: Prefix of the metric names in prometheus().
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS, prefix='asyncswagger11'):
+        self.buckets = tuple(buckets)
+        self.prefix = prefix
+        #: Request latency, including retries, by operation.
+        self.latency = {}
+        #: Number of completed requests by (operation, status). The
+        #: status is None if there was no response.
+        self.statuses = {}
+        #: Number of running requests by operation.
+        self.in_flight = {}
+        #: Time from the start of an attempt until it has a connection,
+        #: including waits for rate limits.
+        self.pool_wait = Histogram(self.buckets)
+        #: Number of websocket messages by URL path.
+        self.ws_received = {}
+        self.ws_sent = {}
+
+    def __repr__(self):
+        return "%s(%d requests)" % (self.__class__.__name__,
+                                    sum(self.statuses.values()))
+
+    def request_started(self, operation):
+        """Record the start of a request.
+
+        :param operation: Nickname of the operation, or None.
+        :return: Start time, to pass to request_finished().
+        """
+        self.in_flight[operation] = self.in_flight.get(operation, 0) + 1
+        return time.monotonic()
+
+    def request_finished(self, operation, started, status):
+        """Record the end of a request.
+
+        :param operation: Nickname of the operation, or None.
+        :param started: Return value of request_started().
+        :param status: HTTP status code, or None.
+        """
+        elapsed = time.monotonic() - started
+        self.in_flight[operation] -= 1
+        try:
+            histogram = self.latency[operation]
+        except KeyError:
+            histogram = self.latency[operation] = Histogram(self.buckets)
+        histogram.observe(elapsed)
+        key = (operation, status)
+        self.statuses[key] = self.statuses.get(key, 0) + 1
+
+    def pool_timer(self):
+        """Returns an httpx trace callback for one request attempt.
+
+        :rtype: PoolTimer
+        """
+        return PoolTimer(self.pool_wait, time.monotonic())
+
+    def snapshot(self):
+        """Returns a copy of the current values as plain data.
+
+        :return: dict with 'latency' (histogram snapshots by
+                 operation), 'statuses' (dict of counts by status, by
+                 operation), 'in_flight', 'pool_wait' and 'websockets'
+                 (received and sent message counts by URL path).
+        """
+        statuses = {}
+        for (operation, status), count in self.statuses.items():
+            statuses.setdefault(operation, {})[status] = count
+        paths = set(self.ws_received) | set(self.ws_sent)
+        return {
+            'latency': {operation: histogram.snapshot()
+                        for operation, histogram in self.latency.items()},
+            'statuses': statuses,
+            'in_flight': dict(self.in_flight),
+            'pool_wait': self.pool_wait.snapshot(),
+            'websockets': {path: {'received': self.ws_received.get(path, 0),
+                                  'sent': self.ws_sent.get(path, 0)}
+                           for path in paths},
+        }
+
+    def prometheus(self):
+        """Returns the metrics in the Prometheus text exposition format.
+
+        :rtype: str
+        """
+        prefix = self.prefix
+        lines = []
+
+        def header(name, kind, text):
+            lines.append('# HELP %s_%s %s' % (prefix, name, text))
+            lines.append('# TYPE %s_%s %s' % (prefix, name, kind))
+
+        def histogram(name, labels, data):
+            for bound, count in data.cumulative():
+                lines.append('%s_%s_bucket%s %d' % (
+                    prefix, name, _labels(labels + (('le', bound),)), count))
+            lines.append('%s_%s_sum%s %r' % (
+                prefix, name, _labels(labels), data.sum))
+            lines.append('%s_%s_count%s %d' % (
+                prefix, name, _labels(labels), data.count))
+
+        header('request_duration_seconds', 'histogram',
+               'Time taken by HTTP requests, including retries.')
+        for operation, data in sorted(self.latency.items(), key=_by_label):
+            histogram('request_duration_seconds',
+                      (('operation', operation),), data)
+
+        header('requests_total', 'counter', 'Completed HTTP requests.')
+        for (operation, status), count in sorted(
+                self.statuses.items(), key=_by_labels):
+            lines.append('%s_requests_total%s %d' % (prefix, _labels(
+                (('operation', operation), ('status', status))), count))
+
+        header('requests_in_flight', 'gauge', 'Running HTTP requests.')
+        for operation, count in sorted(self.in_flight.items(),
+                                       key=_by_label):
+            lines.append('%s_requests_in_flight%s %d' % (
+                prefix, _labels((('operation', operation),)), count))
+
+        header('pool_wait_seconds', 'histogram',
+               'Time spent waiting for a connection.')
+        histogram('pool_wait_seconds', (), self.pool_wait)
+
+        header('websocket_messages_total', 'counter',
+               'Websocket messages.')
+        for direction, counts in (('received', self.ws_received),
+                                  ('sent', self.ws_sent)):
+            for path, count in sorted(counts.items()):
+                lines.append('%s_websocket_messages_total%s %d' % (
+                    prefix, _labels((('path', path),
+                                     ('direction', direction))), count))
+        return '\n'.join(lines) + '\n'
+
+
+def _by_label(item):
+    return str(item[0] or '')
+
+
+def _by_labels(item):
+    return tuple(str(label or '') for label in item[0])
+
+
+def _labels(pairs):
+    """Format Prometheus labels; None is shown as an empty string."""
+    if not pairs:
+        return ''
+    return '{%s}' % ','.join(
+        '%s="%s"' % (name, _label_value(value)) for name, value in pairs)
+
+
+def _label_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, float):
+        return '+Inf' if value == math.inf else repr(value)
+    return str(value).replace('\\', '\\\\').replace('"', '\\"') \
+        .replace('\n', '\\n')
@@ -0,0 +1,340 @@
+#!/usr/bin/env python
+
+#
+# Copyright (c) 2018, Matthias Urlichs
+#
+
+"""Typed objects built from the models of an API declaration.
+
+Each declared model becomes a class with __slots__, one per property.
+Decoding a response fills in the scalar properties at once; properties
+holding other models keep their raw JSON until they are first read, and
+are converted then. Keys that the model doesn't declare are dropped.
+
+Models with a discriminator and subTypes (like ARI's Message and Event)
+decode to the subtype named by the discriminator field.
+"""
+
+import keyword
+import re
+
+#: Matches Swagger 1.1 container types, e.g. "List[Channel]".
+CONTAINER_RE = re.compile(r'^(?:List|Set|Array)\[(.*)\]$')
+
+#: Types that are passed through as decoded from JSON.
+PRIMITIVE_TYPES = frozenset((
+    'void', 'string', 'int', 'long', 'float', 'double', 'boolean', 'byte',
+    'number', 'integer', 'Date', 'date', 'date-time', 'object', 'containers',
+    'binary'))
+
+
+class Model(object):
+    """Base class of the generated model classes.
+    """
+
+    __slots__ = ('_pending',)
+
+    #: Name of the model.
+    _name = None
+    #: (key, attribute) pairs of the scalar properties.
+    _plain = ()
+    #: (key, attribute) pairs of the properties holding models.
+    _nested = ()
+    #: Field selecting the subtype, and the subtypes' names.
+    _discriminator = None
+    _subtypes = frozenset()
+    #: The registry the class was built by.
+    _registry = None
+
+    def __init__(self, **kwargs):
+        self._pending = None
+        for key, attr in self._plain + self._nested:
+            setattr(self, attr, kwargs.pop(attr, None))
+        if kwargs:
+            raise TypeError("%s has no properties %s" %
+                            (self._name, ", ".join(sorted(kwargs))))
+
+    def __repr__(self):
+        return "%s(%s)" % (self.__class__.__name__, ", ".join(
+            "%s=%r" % (attr, getattr(self, attr))
+            for key, attr in self._plain + self._nested
+            if getattr(self, attr) is not None))
+
+    def __eq__(self, other):
+        if type(self) is not type(other):
+            return NotImplemented
+        return all(getattr(self, attr) == getattr(other, attr)
+                   for key, attr in self._plain + self._nested)
+
+    @classmethod
+    def decode(cls, data):
+        """Build an object from decoded JSON.
+
+        :param data: JSON object.
+        :type  data: dict
+        """
+        if cls._discriminator is not None:
+            subtype = data.get(cls._discriminator)
+            if subtype in cls._subtypes:
+                cls = cls._registry[subtype]
+        self = cls.__new__(cls)
+        get = data.get
+        for key, attr in cls._plain:
+            setattr(self, attr, get(key))
+        pending = None
+        for key, attr in cls._nested:
+            value = get(key)
+            setattr(self, '_lazy_' + attr, value)
+            if value is not None:
+                if pending is None:
+                    pending = set()
+                pending.add(attr)
+        self._pending = pending
+        return self
+
+    def to_dict(self):
+        """Convert back to JSON-compatible data.
+
+        Properties that are None are omitted.
+        """
+        ret = {}
+        for key, attr in self._plain + self._nested:
+            value = getattr(self, attr)
+            if value is not None:
+                ret[key] = _to_json(value)
+        return ret
+
+
+def _to_json(value):
+    if isinstance(value, Model):
+        return value.to_dict()
+    if isinstance(value, list):
+        return [_to_json(item) for item in value]
+    return value
+
+
+class LazyProperty(object):
+    """Descriptor for a property holding a model, or a list of them.
+
+    The raw JSON is kept in a separate slot until the property is first
+    read.
+
+    :param attr: Name of the property.
+    :param slot: Slot descriptor holding the value.
+    :param convert: Converts the raw JSON.
+    """
+
+    __slots__ = ('attr', 'slot', 'convert')
+
+    def __init__(self, attr, slot, convert):
+        self.attr = attr
+        self.slot = slot
+        self.convert = convert
+
+    def __get__(self, obj, cls=None):
+        if obj is None:
+            return self
+        value = self.slot.__get__(obj, cls)
+        pending = obj._pending
+        if pending and self.attr in pending:
+            value = self.convert(value)
+            self.slot.__set__(obj, value)
+            pending.discard(self.attr)
+        return value
+
+    def __set__(self, obj, value):
+        self.slot.__set__(obj, value)
+        pending = getattr(obj, '_pending', None)
+        if pending:
+            pending.discard(self.attr)
+
+
+def attribute_name(key):
+    """Python attribute name for a JSON property.
+
+    Characters that can't be used are replaced by underscores, and
+    keywords get one appended, e.g. "from" becomes "from_".
+
+    :param key: Name of the property.
+    """
+    attr = re.sub(r'\W', '_', key)
+    if not attr.isidentifier():
+        attr = '_' + attr
+    if keyword.iskeyword(attr):
+        attr += '_'
+    return attr
+
+
+def model_attribute(key, taken):
+    """Attribute name for a property of a model class.
+
+    Like attribute_name(), but names that Model itself uses (e.g.
+    "decode" or "to_dict"), or that another property already got, have
+    underscores appended.
+
+    :param key: Name of the property.
+    :param taken: Attribute names of the class so far; updated.
+    :type  taken: set
+    """
+    attr = attribute_name(key)
+    while attr in taken or '_lazy_' + attr in taken or hasattr(Model, attr):
+        attr += '_'
+    taken.update((attr, '_lazy_' + attr))
+    return attr
+
+
+class ModelRegistry(object):
+    """The model classes of an API.
+
+    ApiModel builds one registry for the models of all declarations, as
+    a declaration may use models that only another one declares. If two
+    declarations define the same model, the first one wins.
+
+    Classes are generated when first needed, so declarations whose
+    models are never used cost nothing but a reference to their
+    definitions.
+
+    :param definitions: The models, by name.
+    :type  definitions: dict
+    """
+
+    def __init__(self, definitions):
+        self.definitions = definitions
+        self.classes = {}
+        self.parents = {}
+        for name, model in definitions.items():
+            for subtype in model.get('subTypes', ()):
+                self.parents[subtype] = name
+
+    def __repr__(self):
+        return "%s(%s)" % (self.__class__.__name__,
+                           ", ".join(sorted(self.definitions)))
+
+    def __contains__(self, name):
+        return name in self.definitions
+
+    def __getitem__(self, name):
+        """Get the class of a model.
+
+        :param name: Name of the model.
+        :rtype: type
+        :raise KeyError: if there is no such model.
+        """
+        try:
+            return self.classes[name]
+        except KeyError:
+            pass
+        model = self.definitions[name]
+        parent = self.parents.get(name)
+        base = self[parent] if parent is not None else Model
+        cls = self.build(name, model, base)
+        self.classes[name] = cls
+        return cls
+
+    def build(self, name, model, base):
+        """Generate the class of a model.
+
+        :param name: Name of the model.
+        :param model: Model definition.
+        :param base: Base class; the parent model, if any.
+        """
+        inherited = set(key for key, attr in base._plain + base._nested)
+        taken = set()
+        for key, attr in base._plain + base._nested:
+            taken.update((attr, '_lazy_' + attr))
+        plain = []
+        nested = []
+        for key, prop in model.get('properties', {}).items():
+            if key in inherited:
+                continue
+            attr = model_attribute(key, taken)
+            convert = self.converter(prop)
+            if convert is None:
+                plain.append((key, attr))
+            else:
+                nested.append((key, attr, convert))
+
+        slots = [attr for key, attr in plain]
+        ns = {
+            '_name': name,
+            '_plain': base._plain + tuple(plain),
+            '_nested': base._nested + tuple(
+                (key, attr) for key, attr, convert in nested),
+            '_registry': self,
+            '__doc__': model.get('description'),
+        }
+        if model.get('discriminator'):
+            ns['_discriminator'] = model['discriminator']
+            ns['_subtypes'] = frozenset(self.subtypes(name))
+        slots.extend('_lazy_' + attr for key, attr, convert in nested)
+        ns['__slots__'] = tuple(slots)
+        cls = type(attribute_name(name), (base,), ns)
+        for key, attr, convert in nested:
+            setattr(cls, attr, LazyProperty(
+                attr, cls.__dict__['_lazy_' + attr], convert))
+        return cls
+
+    def subtypes(self, name):
+        """All subtypes of a model, recursively.
+
+        :param name: Name of the model.
+        """
+        for subtype in self.definitions[name].get('subTypes', ()):
+            if subtype in self.definitions:
+                yield subtype
+                yield from self.subtypes(subtype)
+
+    def converter(self, prop):
+        """Returns a function converting JSON of a property's type.
+
+        :param prop: Property or operation definition, with a 'type'
+                     (or 'responseClass') and maybe 'items'.
+        :return: The converter, or None if the JSON is used as it is.
+        """
+        type_name = prop.get('type') or prop.get('responseClass')
+        items = prop.get('items')
+        if type_name is None and '$ref' in prop:
+            type_name = prop['$ref']
+        if type_name in ('array', 'List', 'Set') and items:
+            convert = self.converter(items)
+            return None if convert is None else _list_of(convert)
+        match = CONTAINER_RE.match(type_name or '')
+        if match:
+            convert = self.converter({'type': match.group(1)})
+            return None if convert is None else _list_of(convert)
+        if type_name in PRIMITIVE_TYPES or type_name not in self:
+            return None
+        return _model_of(self, type_name)
+
+    def decoder(self, type_name):
+        """Returns a function converting JSON of the given type.
+
+        Unlike converter(), JSON of primitive or unknown types is passed
+        through by the function.
+
+        :param type_name: Name of the type, e.g. an operation's
+                          responseClass.
+        """
+        return self.converter({'type': type_name}) or _identity
+
+
+def _identity(data):
+    return data
+
+
+def _model_of(registry, name):
+    """Converter for a model, resolving its class on first use."""
+    def convert(data):
+        if data is None:
+            return None
+        return registry[name].decode(data)
+    return convert
+
+
+def _list_of(convert):
+    """Converter for a list of items."""
+    def convert_list(data):
+        if data is None:
+            return None
+        return [convert(item) for item in data]
+    return convert_list
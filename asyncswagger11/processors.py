@@ -84,6 +84,124 @@ class SwaggerError(Exception):
         super(Exception, self).__init__(msg, context, cause)
 
 
+#: Names of the SwaggerProcessor methods called while walking the model.
+PROCESSOR_HOOKS = (
+    'process_resource_listing',
+    'process_resource_listing_api',
+    'process_api_declaration',
+    'process_resource_api',
+    'process_operation',
+    'process_parameter',
+    'process_error_response',
+    'process_model',
+    'process_property',
+)
+
+
+def find_hooks(processors):
+    """Collect the hooks that a list of processors implements.
+
+    Hooks that a processor inherits unchanged from SwaggerProcessor do
+    nothing, so they are left out.
+
+    :param processors: Processors to inspect.
+    :type  processors: list of SwaggerProcessor
+    :return: dict mapping each hook name to a list of bound methods, in
+             processor order.
+    """
+    hooks = {}
+    for name in PROCESSOR_HOOKS:
+        default = getattr(SwaggerProcessor, name)
+        hooks[name] = [
+            getattr(processor, name) for processor in processors
+            if getattr(getattr(processor, name), '__func__', None)
+            is not default]
+    return hooks
+
+
+def walk(resources, hooks):
+    """Walk a loaded Swagger definition, calling hooks on each object.
+
+    :param resources: Top level Swagger definition.
+    :type  resources: dict
+    :param hooks: Hooks to call, as returned by find_hooks().
+    :type  hooks: dict
+    """
+    def call(name):
+        for hook in hooks[name]:
+            hook(**context.args)
+
+    context = ParsingContext()
+    resources_url = resources.get('url') or 'json:resource_listing'
+    context.push_str('resources', resources, resources_url)
+    call('process_resource_listing')
+    for listing_api in resources['apis']:
+        context.push('listing_api', listing_api, 'path')
+        call('process_resource_listing_api')
+        context.pop()
+
+        api_url = listing_api.get('url') or 'json:api_declaration'
+        context.push_str('resource', listing_api['api_declaration'],
+                         api_url)
+        call('process_api_declaration')
+        for api in listing_api['api_declaration']['apis']:
+            context.push('api', api, 'path')
+            call('process_resource_api')
+            for operation in api['operations']:
+                context.push('operation', operation, 'nickname')
+                call('process_operation')
+                for parameter in operation.get('parameters', []):
+                    context.push('parameter', parameter, 'name')
+                    call('process_parameter')
+                    context.pop()
+                for response in operation.get('errorResponses', []):
+                    context.push('error_response', response, 'code')
+                    call('process_error_response')
+                    context.pop()
+                context.pop()
+            context.pop()
+        models = listing_api['api_declaration'].get('models', {})
+        for (name, model) in models.items():
+            context.push('model', model, 'id')
+            call('process_model')
+            for (name, prop) in model['properties'].items():
+                context.push('prop', prop, 'name')
+                call('process_property')
+                context.pop()
+            context.pop()
+        context.pop()
+    context.pop()
+    assert context.is_empty(), "Expected %r to be empty" % context
+
+
+def fuse_processors(processors):
+    """Combine processors so that they share a single walk of the model.
+
+    Every object is passed to each processor in turn before the walk
+    moves on, so a processor sees the changes earlier processors made
+    to the current object and its parents, but not to later objects.
+    Processors that override apply() can't take part; they still run
+    on their own, in order.
+
+    :param processors: Processors to combine.
+    :type  processors: list of SwaggerProcessor
+    :return: List of processors to apply instead.
+    """
+    result = []
+    group = []
+    for processor in processors:
+        if type(processor).apply is SwaggerProcessor.apply:
+            group.append(processor)
+            continue
+        if group:
+            result.append(FusedProcessor(group))
+            group = []
+        result.append(processor)
+    if group:
+        result.append(FusedProcessor(group))
+    return result
+
+
 class SwaggerProcessor(object):
     """Post processing interface for Swagger APIs.
 
@@ -97,47 +215,7 @@ class SwaggerProcessor(object):
         :param resources: Top level Swagger definition.
         :type  resources: dict
         """
-        context = ParsingContext()
-        resources_url = resources.get('url') or 'json:resource_listing'
-        context.push_str('resources', resources, resources_url)
-        self.process_resource_listing(**context.args)
-        for listing_api in resources['apis']:
-            context.push('listing_api', listing_api, 'path')
-            self.process_resource_listing_api(**context.args)
-            context.pop()
-
-            api_url = listing_api.get('url') or 'json:api_declaration'
-            context.push_str('resource', listing_api['api_declaration'],
-                             api_url)
-            self.process_api_declaration(**context.args)
-            for api in listing_api['api_declaration']['apis']:
-                context.push('api', api, 'path')
-                self.process_resource_api(**context.args)
-                for operation in api['operations']:
-                    context.push('operation', operation, 'nickname')
-                    self.process_operation(**context.args)
-                    for parameter in operation.get('parameters', []):
-                        context.push('parameter', parameter, 'name')
-                        self.process_parameter(**context.args)
-                        context.pop()
-                    for response in operation.get('errorResponses', []):
-                        context.push('error_response', response, 'code')
-                        self.process_error_response(**context.args)
-                        context.pop()
-                    context.pop()
-                context.pop()
-            models = listing_api['api_declaration'].get('models', {})
-            for (name, model) in models.items():
-                context.push('model', model, 'id')
-                self.process_model(**context.args)
-                for (name, prop) in model['properties'].items():
-                    context.push('prop', prop, 'name')
-                    self.process_property(**context.args)
-                    context.pop()
-                context.pop()
-            context.pop()
-        context.pop()
-        assert context.is_empty(), "Expected %r to be empty" % context
+        walk(resources, find_hooks([self]))
 
     def process_resource_listing(self, resources, context):
         """Post process a resources.json object.
@@ -246,6 +324,26 @@ class SwaggerProcessor(object):
         pass
 
 
+class FusedProcessor(SwaggerProcessor):
+    """Applies several processors in a single walk of the model.
+
+    See fuse_processors().
+
+    :param processors: Processors to apply.
+    :type  processors: list of SwaggerProcessor
+    """
+
+    def __init__(self, processors):
+        self.processors = processors
+        self.hooks = find_hooks(processors)
+
+    def __repr__(self):
+        return "%s(%r)" % (self.__class__.__name__, self.processors)
+
+    def apply(self, resources):
+        walk(resources, self.hooks)
+
+
 # noinspection PyDocstring
 class WebsocketProcessor(SwaggerProcessor):
     """Process the WebSocket extension for Swagger
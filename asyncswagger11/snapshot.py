@@ -0,0 +1,185 @@
+#!/usr/bin/env python
+
+#
+# Copyright (c) 2018, Matthias Urlichs
+#
+
+"""Single-file snapshots of a processed API.
+
+A snapshot holds a resource listing with all its API declarations,
+already processed for clients, so that a SwaggerClient can start
+without fetching or processing any API documents::
+
+    # at build time
+    await create_snapshot(
+        "http://localhost:8088/ari/api-docs/resources.json",
+        "ari.swagger-snapshot")
+
+    # in production
+    client = SwaggerClient("ari.swagger-snapshot",
+                           base_url="http://asterisk:8088/ari")
+
+The file is a fixed header followed by the listing in marshal format,
+which is read with a single mmap or read call. The header carries a
+digest of the payload, which is always checked, and a hash of the API
+itself (see spec_hash()), which may be compared with an expected value.
+"""
+
+import hashlib
+import json
+import marshal
+import mmap
+import os
+import struct
+import tempfile
+
+#: File name suffix that SwaggerClient recognizes.
+SNAPSHOT_SUFFIX = '.swagger-snapshot'
+
+MAGIC = b'ASW11SNP'
+VERSION = 1
+#: magic, format version, marshal version, spec hash, payload digest
+HEADER = struct.Struct('>8sHH32s32s')
+
+
+class SnapshotError(Exception):
+    """A snapshot file is damaged, outdated, or not a snapshot.
+    """
+
+
+def without(obj, keys):
+    """Shallow copy of a dict, without some keys.
+
+    :param obj: Dict to copy.
+    :param keys: Keys to leave out.
+    """
+    return dict((key, value) for key, value in obj.items()
+                if key not in keys)
+
+
+def spec_hash(resource_listing):
+    """Hash of a processed API.
+
+    Validators (ETags, modification times), the URLs the documents were
+    loaded from and the basePaths don't contribute, so the same API
+    served from anywhere (e.g. by several Asterisk nodes, which each
+    put their own address into basePath) hashes the same.
+
+    :param resource_listing: Processed resource listing.
+    :type  resource_listing: dict
+    :return: SHA-256 digest.
+    :rtype: bytes
+    """
+    listing = without(resource_listing, ('validators', 'url', 'basePath'))
+    apis = []
+    for api in listing.get('apis', []):
+        api = without(api, ('url',))
+        if 'api_declaration' in api:
+            api['api_declaration'] = without(api['api_declaration'],
+                                             ('basePath',))
+        apis.append(api)
+    listing['apis'] = apis
+    data = json.dumps(listing, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(data.encode('utf-8')).digest()
+
+
+def save_snapshot(path, resource_listing):
+    """Write a snapshot file.
+
+    The file is replaced atomically.
+
+    :param path: Name of the snapshot file.
+    :param resource_listing: Resource listing, processed for clients, as
+                             returned by Loader.load_resource_listing().
+    :type  resource_listing: dict
+    :return: The API's hash, see spec_hash().
+    """
+    try:
+        payload = marshal.dumps(resource_listing)
+    except ValueError as err:
+        raise SnapshotError("Resource listing can't be marshalled: %s" %
+                            (err,)) from None
+    source = spec_hash(resource_listing)
+    header = HEADER.pack(MAGIC, VERSION, marshal.version, source,
+                         hashlib.sha256(payload).digest())
+
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path) or '.',
+                               suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as fp:
+            fp.write(header)
+            fp.write(payload)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    return source
+
+
+def load_snapshot(path, expected_hash=None, use_mmap=True):
+    """Read a snapshot file.
+
+    :param path: Name of the snapshot file.
+    :param expected_hash: If set, the API's hash must match it.
+    :type  expected_hash: bytes or hex str
+    :param use_mmap: Map the file instead of reading it.
+    :return: The processed resource listing.
+    :rtype: dict
+    :raise: SnapshotError: if the file is damaged or doesn't match.
+    """
+    with open(path, 'rb') as fp:
+        if use_mmap:
+            try:
+                data = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:  # empty file
+                data = b''
+        else:
+            data = fp.read()
+    try:
+        with memoryview(data) as view:
+            return _decode(path, view, expected_hash)
+    finally:
+        if use_mmap and data:
+            data.close()
+
+
+def _decode(path, view, expected_hash):
+    if len(view) < HEADER.size:
+        raise SnapshotError("%s: not a snapshot" % (path,))
+    magic, version, marshal_version, source, digest = \
+        HEADER.unpack_from(view)
+    if magic != MAGIC:
+        raise SnapshotError("%s: not a snapshot" % (path,))
+    if version != VERSION or marshal_version != marshal.version:
+        raise SnapshotError("%s: unsupported snapshot version %d.%d" %
+                            (path, version, marshal_version))
+    if expected_hash is not None:
+        if isinstance(expected_hash, str):
+            expected_hash = bytes.fromhex(expected_hash)
+        if source != expected_hash:
+            raise SnapshotError("%s: snapshot is of a different API (%s)" %
+                                (path, source.hex()))
+    with view[HEADER.size:] as payload:
+        if hashlib.sha256(payload).digest() != digest:
+            raise SnapshotError("%s: snapshot is damaged" % (path,))
+        try:
+            return marshal.loads(payload)
+        except (EOFError, ValueError, TypeError) as err:
+            raise SnapshotError("%s: snapshot is damaged: %s" %
+                                (path, err)) from None
+
+
+async def create_snapshot(url, path, http_client=None):
+    """Load and process an API, and save it as a snapshot.
+
+    :param url: URL of the resource listing.
+    :param path: Name of the snapshot file.
+    :param http_client: HTTP client API to load with.
+    :return: The API's hash, see spec_hash().
+    """
+    from asyncswagger11.client import client_processors
+    from asyncswagger11.swagger_model import load_url
+
+    resource_listing = await load_url(url, http_client=http_client,
+                                      processors=client_processors())
+    return save_snapshot(path, resource_listing)
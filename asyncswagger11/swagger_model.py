@@ -7,15 +7,28 @@
 """Code for handling the base Swagger API model.
 """
 
-import json
+import logging
 import os
-import urllib
+import urllib.parse
+import urllib.request
 
+import anyio
+
+from asyncswagger11 import codec as json_codec
 from asyncswagger11.http_client import AsynchronousHttpClient
-from asyncswagger11.processors import SwaggerProcessor, SwaggerError
+from asyncswagger11.processors import SwaggerProcessor, SwaggerError, \
+    fuse_processors
+
+log = logging.getLogger(__name__)
 
 SWAGGER_VERSIONS = ["1.1"]
 
+#: Response headers that are used to revalidate a cached document.
+VALIDATOR_HEADERS = ('etag', 'last-modified')
+
+#: Default number of API declarations fetched at the same time.
+MAX_CONCURRENT_LOADS = 10
+
 SWAGGER_PRIMITIVES = [
     'void',
     'string',
@@ -101,25 +114,73 @@ class ValidationProcessor(SwaggerProcessor):
         required_fields = ['type']
         validate_required_fields(prop, required_fields, context)
 
-async def json_load_url(http_client, url):
+def read_file_url(url, codec, validators=None):
+    """Read and parse JSON from a file: URL.
+
+    This blocks; json_load_url() runs it in a worker thread.
+
+    :param url: file: URL of the JSON document.
+    :param codec: JSON codec to parse with.
+    :type  codec: codec.Codec
+    :param validators: Validators of a previous load of this URL.
+    :type  validators: dict
+    :return: Parsed JSON dict, or None if it has not been modified.
+    """
+    # requests can't handle file: URLs
+    fp = urllib.request.urlopen(url)
+    try:
+        if validators is not None:
+            mtime = os.fstat(fp.fileno()).st_mtime_ns
+            if validators.get('mtime') == mtime:
+                return None
+            validators.clear()
+            validators['mtime'] = mtime
+        return codec.loads(fp.read())
+    finally:
+        fp.close()
+
+
+async def json_load_url(http_client, url, validators=None):
     """Download and parse JSON from a URL.
 
+    If validators is given, the request is made conditional on the
+    validators from an earlier load, and the dict is updated with the
+    validators of the new response: ETag and Last-Modified headers for
+    HTTP, the modification time for file: URLs.
+
+    file: URLs are read in a worker thread, so that slow file systems
+    don't block the event loop.
+
     :param http_client: HTTP client interface.
     :type  http_client: http_client.HttpClient
     :param url: URL for JSON to parse
-    :return: Parsed JSON dict
+    :param validators: Validators of a previous load of this URL.
+    :type  validators: dict
+    :return: Parsed JSON dict, or None if it has not been modified.
     """
     scheme = urllib.parse.urlparse(url).scheme
     if scheme == 'file':
-        # requests can't handle file: URLs
-        fp = urllib.request.urlopen(url)
-        try:
-            return json.load(fp)
-        finally:
-            fp.close()
+        codec = json_codec.default if http_client is None \
+            else http_client.codec
+        return await anyio.to_thread.run_sync(
+            read_file_url, url, codec, validators)
     else:
-        resp = await http_client.request('GET', url)
-        return resp.json()
+        headers = {}
+        if validators:
+            if 'etag' in validators:
+                headers['If-None-Match'] = validators['etag']
+            if 'last-modified' in validators:
+                headers['If-Modified-Since'] = validators['last-modified']
+        resp = await http_client.request('GET', url, headers=headers)
+        if resp.status_code == 304:
+            return None
+        if validators is not None:
+            validators.clear()
+            for name in VALIDATOR_HEADERS:
+                if name in resp.headers:
+                    validators[name] = resp.headers[name]
+        return http_client.codec.loads(resp.content)
+
 
 class Loader(object):
     """Abstraction for loading Swagger APIs.
@@ -128,49 +189,212 @@ class Loader(object):
     :type  http_client: http_client.HttpClient
     :param processors: List of processors to apply to the API.
     :type  processors: list of SwaggerProcessor
+    :param max_concurrency: Maximum number of API declarations to fetch
+                            in parallel.
+    :type  max_concurrency: int
+    :param cache: Cache for processed resource listings.
+    :type  cache: cache.SpecCache
+    :param fused: Apply all processors in a single walk of the model,
+                  see processors.fuse_processors(). Otherwise each
+                  processor walks the whole model in turn.
     """
 
-    def __init__(self, http_client, processors=None):
+    def __init__(self, http_client, processors=None,
+                 max_concurrency=MAX_CONCURRENT_LOADS, cache=None,
+                 fused=True):
         self.http_client = http_client
+        self.max_concurrency = max_concurrency
+        self.cache = cache
         if processors is None:
             processors = []
             # always go through the validation processor first
         # noinspection PyTypeChecker
         self.processors = [ValidationProcessor()] + processors
+        if fused:
+            self.pipeline = fuse_processors(self.processors)
+        else:
+            self.pipeline = self.processors
 
-    async def load_resource_listing(self, resources_url, base_url=None):
+    async def load_resource_listing(self, resources_url, base_url=None,
+                                    fetched=None):
         """Load a resource listing, loading referenced API declarations.
 
         The following fields are added to the resource listing object model.
          * ['url'] = URL resource listing was loaded from
+         * ['validators'] = validators of all loaded documents, by URL
          * The ['apis'] array is modified according to load_api_declaration()
 
         The Loader's processors are applied to the fully loaded resource
         listing.
 
+        If the Loader has a cache and it holds a listing for this URL,
+        every document is revalidated with a conditional request. If none
+        of them changed, the cached listing is returned as-is, without
+        downloading or processing anything. Documents that did change are
+        not downloaded a second time.
+
         :param resources_url:   File name for resources.json
         :param base_url:    Optional URL to be the base URL for finding API
                             declarations. If not specified, 'basePath' from the
                             resource listing is used.
+        :param fetched: Documents already downloaded by revalidate(), which
+                        are used instead of loading them again. The cache
+                        is not checked if this is not empty.
+        :type  fetched: dict
         """
+        if fetched is None:
+            fetched = {}
+
+        if self.cache is not None and not fetched:
+            entry = await self._cache_call(self.cache.get, resources_url)
+            if entry is not None and \
+                    entry['base_url'] == base_url and \
+                    entry['processors'] == self.processor_names() and \
+                    await self.revalidate(entry['listing'], fetched):
+                return entry['listing']
 
         # Load the resource listing
-        resource_listing = await json_load_url(self.http_client, resources_url)
+        validators = {resources_url: {}}
+        resource_listing = await self.load_document(
+            resources_url, validators[resources_url], fetched)
 
         # Some extra data only known about at load time
         resource_listing['url'] = resources_url
-        if not base_url:
-            base_url = resource_listing.get('basePath')
+        resource_listing['validators'] = validators
+        listing_base_url = base_url
+        if not listing_base_url:
+            listing_base_url = resource_listing.get('basePath')
 
         # Load the API declarations
-        for api in resource_listing.get('apis'):
-            await self.load_api_declaration(base_url, api)
+        await self.load_api_declarations(
+            listing_base_url, resource_listing.get('apis'), validators,
+            fetched)
 
         # Now that the raw object model has been loaded, apply the processors
         self.process_resource_listing(resource_listing)
+
+        if self.cache is not None:
+            await self._cache_call(self.cache.put, resources_url, {
+                'base_url': base_url,
+                'processors': self.processor_names(),
+                'listing': resource_listing,
+            })
         return resource_listing
 
-    async def load_api_declaration(self, base_url, api_dict):
+    async def _cache_call(self, method, *args):
+        """Call a cache method, in a worker thread if the cache blocks.
+
+        :param method: Bound method of self.cache.
+        """
+        if getattr(self.cache, 'blocking', False):
+            return await anyio.to_thread.run_sync(method, *args)
+        return method(*args)
+
+    async def revalidate(self, resource_listing, fetched=None):
+        """Check whether a loaded resource listing is still current.
+
+        Every document the listing was built from is checked with a
+        conditional request, using the validators recorded at load time.
+
+        :param resource_listing: Resource listing to check.
+        :param fetched: Stores the documents that have changed, by URL,
+                        for load_resource_listing().
+        :type  fetched: dict
+        :return: True if no document has changed, False otherwise.
+        """
+        validators = resource_listing.get('validators')
+        if not validators:
+            return False
+        limiter = anyio.CapacityLimiter(self.max_concurrency)
+        changed = []
+
+        async def _check(url, old_validators):
+            new_validators = dict(old_validators)
+            try:
+                async with limiter:
+                    res = await json_load_url(
+                        self.http_client, url, new_validators)
+            except Exception:
+                log.debug("Revalidating %s failed", url, exc_info=True)
+                changed.append(url)
+            else:
+                if res is not None:
+                    changed.append(url)
+                    if fetched is not None:
+                        fetched[url] = (res, new_validators)
+
+        async with anyio.create_task_group() as tg:
+            for url, old_validators in validators.items():
+                tg.start_soon(_check, url, old_validators)
+
+        return not changed
+
+    async def load_document(self, url, validators, fetched=None):
+        """Load one JSON document, unless revalidate() already has.
+
+        :param url: URL of the document.
+        :param validators: Updated with the validators of the document.
+        :type  validators: dict
+        :param fetched: Documents downloaded by revalidate(). The entry
+                        for this URL is used up.
+        :type  fetched: dict
+        :return: Parsed JSON dict.
+        """
+        if fetched:
+            try:
+                res, new_validators = fetched.pop(url)
+            except KeyError:
+                pass
+            else:
+                validators.update(new_validators)
+                return res
+        return await json_load_url(self.http_client, url, validators)
+
+    def processor_names(self):
+        """Returns the names of the processors applied by this Loader.
+
+        This is used to tell whether a cached listing has been processed
+        the same way.
+        """
+        return ["%s.%s" % (type(processor).__module__,
+                           type(processor).__qualname__)
+                for processor in self.processors]
+
+    async def load_api_declarations(self, base_url, apis, validators=None,
+                                    fetched=None):
+        """Load a list of API declarations concurrently.
+
+        Each entry of apis is filled in by load_api_declaration(), so the
+        result is in listing order no matter which download finishes
+        first. If loads fail, the error of the first failing entry is
+        raised once all of them are done.
+
+        :param base_url: Base URL to load from
+        :param apis: api objects from resource listing.
+        :param validators: dict to store the validators of each
+                           declaration in, by URL.
+        :param fetched: Documents already downloaded, see load_document().
+        """
+        limiter = anyio.CapacityLimiter(self.max_concurrency)
+        errors = []
+
+        async def _load(pos, api_dict):
+            try:
+                async with limiter:
+                    await self.load_api_declaration(
+                        base_url, api_dict, validators, fetched)
+            except Exception as exc:
+                errors.append((pos, exc))
+
+        async with anyio.create_task_group() as tg:
+            for pos, api_dict in enumerate(apis):
+                tg.start_soon(_load, pos, api_dict)
+
+        if errors:
+            raise min(errors, key=lambda err: err[0])[1]
+
+    async def load_api_declaration(self, base_url, api_dict, validators=None,
+                                   fetched=None):
         """Load an API declaration file.
 
         api_dict is modified with the results of the load:
@@ -179,18 +403,25 @@ class Loader(object):
 
         :param base_url: Base URL to load from
         :param api_dict: api object from resource listing.
+        :param validators: dict to store the validators of the
+                           declaration in, by URL.
+        :param fetched: Documents already downloaded, see load_document().
         """
         path = api_dict.get('path').replace('{format}', 'json')
-        api_dict['url'] = urllib.parse.urljoin(base_url + '/', path.strip('/'))
-        api_dict['api_declaration'] = await json_load_url(
-            self.http_client, api_dict['url'])
+        url = urllib.parse.urljoin(base_url + '/', path.strip('/'))
+        api_dict['url'] = url
+        url_validators = {}
+        if validators is not None:
+            validators[url] = url_validators
+        api_dict['api_declaration'] = await self.load_document(
+            url, url_validators, fetched)
 
     def process_resource_listing(self, resources):
         """Apply processors to a resource listing.
 
         :param resources: Resource listing to process.
         """
-        for processor in self.processors:
+        for processor in self.pipeline:
             processor.apply(resources)
 
 
@@ -210,13 +441,15 @@ def validate_required_fields(json, required_fields, context):
             "Missing fields: %s" % ', '.join(missing_fields), context)
 
 
-async def load_file(resource_listing_file, http_client=None, processors=None):
+async def load_file(resource_listing_file, http_client=None, processors=None,
+                    cache=None):
     """Loads a resource listing file, applying the given processors.
 
     :param http_client: HTTP client interface.
     :param resource_listing_file: File name for a resource listing.
     :param processors:  List of SwaggerProcessors to apply to the resulting
                         resource.
+    :param cache: Optional cache for the processed resource listing.
     :return: Processed object model from
     :raise: IOError: On error reading api-docs.
     """
@@ -226,12 +459,12 @@ async def load_file(resource_listing_file, http_client=None, processors=None):
     dir_path = os.path.dirname(file_path)
     base_url = urllib.parse.urljoin('file:', urllib.request.pathname2url(dir_path))
     resp = await load_url(url, http_client=http_client, processors=processors,
-                    base_url=base_url)
+                    base_url=base_url, cache=cache)
     return resp
 
 
 async def load_url(resource_listing_url, http_client=None, processors=None,
-                 base_url=None):
+                 base_url=None, cache=None):
     """Loads a resource listing, applying the given processors.
 
     :param resource_listing_url: URL for a resource listing.
@@ -241,13 +474,15 @@ async def load_url(resource_listing_url, http_client=None, processors=None,
     :param base_url:    Optional URL to be the base URL for finding API
                         declarations. If not specified, 'basePath' from the
                         resource listing is used.
+    :param cache: Optional cache for the processed resource listing.
     :return: Processed object model from
     :raise: IOError, URLError: On error reading api-docs.
     """
     client = http_client or AsynchronousHttpClient()
 
     try:
-        loader = Loader(http_client=http_client, processors=processors)
+        loader = Loader(http_client=client, processors=processors,
+                        cache=cache)
         resp = await loader.load_resource_listing(
             resource_listing_url, base_url=base_url)
 
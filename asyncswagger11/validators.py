@@ -0,0 +1,165 @@
+#!/usr/bin/env python
+
+#
+# Copyright (c) 2018, Matthias Urlichs
+#
+
+"""Client-side validation of operation arguments.
+
+A validator is compiled once per parameter from its dataType,
+allowableValues and allowMultiple. It is called with an argument and
+returns it, coerced to the declared type, or raises TypeError (the
+value can't be converted) or ValueError (it isn't one of the allowable
+values). Strings need no coercion to a string: callers may skip
+coerce_string for them.
+"""
+
+
+def coerce_string(value):
+    if isinstance(value, str):
+        return value
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return str(value)
+    raise TypeError("expected a string, not %r" % (value,))
+
+
+def coerce_int(value):
+    if isinstance(value, bool):
+        raise TypeError("expected an integer, not %r" % (value,))
+    if isinstance(value, int):
+        return value
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if isinstance(value, str):
+        return int(value)
+    raise TypeError("expected an integer, not %r" % (value,))
+
+
+def coerce_float(value):
+    # Integers are left alone, so that 3 is sent as "3", not "3.0".
+    if isinstance(value, bool):
+        raise TypeError("expected a number, not %r" % (value,))
+    if isinstance(value, (int, float)):
+        return value
+    if isinstance(value, str):
+        try:
+            return int(value)
+        except ValueError:
+            return float(value)
+    raise TypeError("expected a number, not %r" % (value,))
+
+
+def coerce_boolean(value):
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, str):
+        try:
+            return BOOLEAN_STRINGS[value.lower()]
+        except KeyError:
+            raise ValueError("expected true or false, not %r" % (value,))
+    if value in (0, 1):
+        return bool(value)
+    raise TypeError("expected a boolean, not %r" % (value,))
+
+
+BOOLEAN_STRINGS = {'true': True, 'false': False}
+
+#: Coercion functions by dataType. Other types are not checked.
+COERCIONS = {
+    'string': coerce_string,
+    'int': coerce_int,
+    'integer': coerce_int,
+    'long': coerce_int,
+    'byte': coerce_int,
+    'float': coerce_float,
+    'double': coerce_float,
+    'number': coerce_float,
+    'boolean': coerce_boolean,
+}
+
+
+def compile_validator(param):
+    """Compile the validator of a parameter.
+
+    :param param: Parameter model.
+    :type  param: dict
+    :return: The validator, or None if there is nothing to check.
+    """
+    coerce = COERCIONS.get(param.get('dataType'))
+    allowed = param.get('allowableValues') or {}
+    value_type = str(allowed.get('valueType', '')).upper()
+    check = None
+    if value_type == 'LIST':
+        check = one_of(allowed['values'], coerce)
+    elif value_type == 'RANGE':
+        check = in_range(coerce_float(allowed['min'])
+                         if 'min' in allowed else None,
+                         coerce_float(allowed['max'])
+                         if 'max' in allowed else None)
+
+    if coerce is None and check is None:
+        return None
+    if check is None:
+        validate = coerce
+    elif coerce is None:
+        validate = check
+    else:
+        def validate(value):
+            return check(coerce(value))
+    if param.get('allowMultiple'):
+        return each(validate)
+    return validate
+
+
+def one_of(values, coerce=None):
+    """Validator for a list of allowable values.
+
+    :param values: The allowable values.
+    :param coerce: Applied to the allowable values, so that they compare
+                   equal to coerced arguments.
+    """
+    if coerce is not None:
+        values = [coerce(value) for value in values]
+    values = frozenset(values)
+    shown = ", ".join(sorted(map(str, values)))
+
+    def validate(value):
+        if value not in values:
+            raise ValueError("%r is not one of %s" % (value, shown))
+        return value
+    return validate
+
+
+def in_range(low=None, high=None):
+    """Validator for a numeric range, inclusive.
+
+    :param low: Minimum value, or None.
+    :param high: Maximum value, or None.
+    """
+    def validate(value):
+        if (low is not None and value < low) or \
+                (high is not None and value > high):
+            raise ValueError("%r is not in range %s..%s" % (
+                value, "" if low is None else low,
+                "" if high is None else high))
+        return value
+    return validate
+
+
+def each(validate):
+    """Validator for a parameter that accepts a list of values.
+
+    A string is taken to be a comma-separated list, as it is sent
+    unchanged. Lists are returned joined the same way, ready to send.
+
+    :param validate: Validator for a single value.
+    """
+    def validate_each(value):
+        if isinstance(value, str):
+            if validate is coerce_string:
+                return value
+            value = value.split(',')
+        if isinstance(value, (list, tuple)):
+            return ",".join([str(validate(item)) for item in value])
+        return validate(value)
+    return validate_each
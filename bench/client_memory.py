@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+
+#
+# Copyright (c) 2018, Matthias Urlichs
+#
+
+"""Memory benchmark: bytes per SwaggerClient.
+
+Builds a resource listing shaped like Asterisk's ARI (ten resources,
+about a hundred operations), then measures how much memory each
+additional client takes once all of its resources and operations have
+been used: once with every client building its own ApiModel, once with
+all of them sharing one. Run from the source tree::
+
+    $ PYTHONPATH=. python3 bench/client_memory.py
+"""
+
+import copy
+import gc
+import tracemalloc
+
+import anyio
+
+from asyncswagger11.client import SwaggerClient, ApiModel
+from asyncswagger11.http_client import HttpClient
+
+BASE = "http://localhost:8088/ari"
+RESOURCES = {
+    "asterisk": 12, "endpoints": 6, "channels": 33, "bridges": 14,
+    "recordings": 10, "sounds": 2, "playbacks": 3, "deviceStates": 4,
+    "mailboxes": 4, "events": 2, "applications": 5,
+}
+N_CLIENTS = 50
+
+
+def ari_listing():
+    """Returns an ARI-sized resource listing."""
+    apis = []
+    for name, n_ops in RESOURCES.items():
+        decl_apis = []
+        for n in range(n_ops):
+            decl_apis.append({
+                "path": "/%s/{%sId}/op%d" % (name, name, n),
+                "description": "Operation %d on %s" % (n, name),
+                "operations": [{
+                    "httpMethod": "POST" if n % 2 else "GET",
+                    "summary": "Do something with a %s." % name,
+                    "nickname": "op%d" % n,
+                    "responseClass": "void",
+                    "parameters": [
+                        {"name": "%sId" % name, "paramType": "path",
+                         "description": "%s's id" % name,
+                         "required": True, "allowMultiple": False,
+                         "dataType": "string"},
+                        {"name": "media", "paramType": "query",
+                         "description": "Media URIs to play.",
+                         "required": False, "allowMultiple": True,
+                         "dataType": "string"},
+                        {"name": "timeout", "paramType": "query",
+                         "description": "Timeout in seconds.",
+                         "required": False, "allowMultiple": False,
+                         "dataType": "int"},
+                    ],
+                    "errorResponses": [
+                        {"code": 404, "reason": "%s not found" % name},
+                    ],
+                }],
+            })
+        apis.append({
+            "path": "/api-docs/%s.{format}" % name,
+            "description": "%s resources" % name,
+            "api_declaration": {
+                "swaggerVersion": "1.1",
+                "basePath": BASE,
+                "resourcePath": "/api-docs/%s.{format}" % name,
+                "apis": decl_apis,
+                "models": {},
+            },
+        })
+    return {"swaggerVersion": "1.1", "basePath": BASE, "apis": apis}
+
+
+async def make_client(listing=None, model=None):
+    client = SwaggerClient(url=listing, model=model, http_client=HttpClient())
+    await client.init()
+    for resource in client.resources.values():
+        for operation in resource.operations.values():
+            pass
+    return client
+
+
+async def measure(name, **args):
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    clients = [await make_client(**args) for _ in range(N_CLIENTS)]
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    print("%-8s %d clients, %d bytes per client" % (
+        name, len(clients), (after - before) / N_CLIENTS))
+
+
+async def main():
+    listing = ari_listing()
+    client = await make_client(copy.deepcopy(listing))  # warm up
+
+    # The listing itself is shared, so this counts the client objects
+    await measure("own", listing=listing)
+    await measure("shared", model=client.model)
+
+
+if __name__ == "__main__":
+    anyio.run(main)
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+
+#
+# Copyright (c) 2018, Matthias Urlichs
+#
+
+"""Micro-benchmark: JSON codec throughput.
+
+Encodes and decodes payloads shaped like real ARI traffic (a StasisStart
+event, a channel list, a bridge creation body) with every codec that is
+installed. Run from the source tree::
+
+    $ PYTHONPATH=. python3 bench/codec.py
+"""
+
+import timeit
+
+from asyncswagger11.codec import CODECS
+
+
+def channel(n):
+    return {
+        "id": "1521034525.%d" % n,
+        "name": "PJSIP/alice-%08x" % n,
+        "state": "Up",
+        "caller": {"name": "Alice Müller", "number": "+4930123456%02d" % n},
+        "connected": {"name": "", "number": ""},
+        "accountcode": "",
+        "dialplan": {"context": "from-internal", "exten": "100",
+                     "priority": 1, "app_name": "Stasis",
+                     "app_data": "hello"},
+        "creationtime": "2018-03-14T14:35:25.123+0100",
+        "language": "de",
+        "channelvars": {"CDR(userfield)": "", "PJSIP_HEADER(read,X-Id)":
+                        "abc-%d" % n},
+    }
+
+
+PAYLOADS = {
+    "event": {
+        "type": "StasisStart",
+        "timestamp": "2018-03-14T14:35:25.456+0100",
+        "args": ["inbound", "queue=support"],
+        "channel": channel(1),
+        "asterisk_id": "52:54:00:12:34:56",
+        "application": "hello",
+    },
+    "channels": [channel(n) for n in range(50)],
+    "body": {"variables": {"CALLERID(name)": "Alice", "X-Trace": "t" * 32}},
+}
+
+
+def main():
+    codecs = []
+    for codec in CODECS:
+        try:
+            codecs.append(codec())
+        except ImportError:
+            print("%-7s not installed" % (codec.name,))
+
+    for payload, obj in PAYLOADS.items():
+        data = codecs[-1].dumps(obj)
+        print("%s: %d bytes" % (payload, len(data)))
+        for codec in codecs:
+            assert codec.loads(codec.dumps(obj)) == obj
+            for op, func in (
+                    ("dumps", lambda: codec.dumps(obj)),
+                    ("loads", lambda: codec.loads(data))):
+                n, secs = timeit.Timer(func).autorange()
+                best = min(timeit.repeat(func, number=n, repeat=7))
+                print("  %-7s %s %8.1f MB/s" % (
+                    codec.name, op, n * len(data) / best / 1e6))
+
+
+if __name__ == "__main__":
+    main()
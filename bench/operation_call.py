@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+
+#
+# Copyright (c) 2018, Matthias Urlichs
+#
+
+"""Micro-benchmark: cost of binding arguments in Operation.__call__.
+
+Compares the per-call parameter walk that Operation.__call__ used to do
+with the precompiled RequestPlan, with and without argument validation,
+using an operation shaped like ARI's channels.play. Run from the source tree::
+
+    $ PYTHONPATH=. python3 bench/operation_call.py
+"""
+
+import timeit
+import urllib.parse
+
+from asyncswagger11.client import RequestPlan
+
+URI = "http://localhost:8088/ari/channels/{channelId}/play/{playbackId}"
+OPERATION = {
+    "httpMethod": "POST",
+    "nickname": "playWithId",
+    "parameters": [
+        {"name": "channelId", "paramType": "path", "required": True,
+         "dataType": "string"},
+        {"name": "playbackId", "paramType": "path", "required": True,
+         "dataType": "string"},
+        {"name": "media", "paramType": "query", "required": True,
+         "dataType": "string", "allowMultiple": True},
+        {"name": "lang", "paramType": "query", "required": False,
+         "dataType": "string"},
+        {"name": "offsetms", "paramType": "query", "required": False,
+         "dataType": "int"},
+        {"name": "skipms", "paramType": "query", "required": False,
+         "dataType": "int", "allowableValues": {"valueType": "RANGE",
+                                                "min": 0}},
+    ],
+}
+ARGS = dict(channelId="1521034525.42", playbackId="pb-17",
+            media=["sound:hello-world", "sound:beep"], lang="en")
+
+
+def walk(uri, operation, kwargs):
+    """The parameter handling of the old Operation.__call__."""
+    params = {}
+    data = None
+    for param in operation.get('parameters', []):
+        pname = param['name']
+        value = kwargs.get(pname)
+        if isinstance(value, list):
+            value = ",".join(value)
+        if value is not None:
+            if param['paramType'] == 'path':
+                uri = uri.replace('{%s}' % pname,
+                                  urllib.parse.quote_plus(str(value)))
+            elif param['paramType'] == 'query':
+                params[pname] = value
+            elif param['paramType'] == 'body':
+                if not data:
+                    data = {}
+                data[pname] = value
+            del kwargs[pname]
+        elif param['required']:
+            raise TypeError(pname)
+    if kwargs:
+        raise TypeError(kwargs)
+    return uri, params, data
+
+
+def main():
+    plan = RequestPlan(URI, OPERATION)
+    assert walk(URI, OPERATION, dict(ARGS)) == plan.bind(dict(ARGS))
+
+    for name, func in (
+            ("before", lambda: walk(URI, OPERATION, dict(ARGS))),
+            ("after", lambda: plan.bind(dict(ARGS))),
+            ("no validation", lambda: plan.bind(dict(ARGS), False))):
+        n, secs = timeit.Timer(func).autorange()
+        best = min(timeit.repeat(func, number=n, repeat=15))
+        print("%-13s %10.0f calls/s" % (name, n / best))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+
+#
+# Copyright (c) 2018, Matthias Urlichs
+#
+
+import anyio
+import pytest
+
+from asyncswagger11.batch import Batch
+from asyncswagger11.client import SwaggerClient
+
+
+class FakeOperation:
+    """Sleeps, records concurrency per host, fails on request.
+
+    If block is set, calls that don't fail never return.
+    """
+    def __init__(self, host, running, block=False):
+        self.nickname = "op"
+        self.uri = "http://%s/ari/op" % host
+        self.host = host
+        self.running = running
+        self.block = block
+        self.entered = anyio.Event()
+
+    async def __call__(self, n, fail=False):
+        self.entered.set()
+        self.running.setdefault('started', []).append(self.host)
+        self.running[self.host] = self.running.get(self.host, 0) + 1
+        self.running['max ' + self.host] = max(
+            self.running.get('max ' + self.host, 0), self.running[self.host])
+        try:
+            await anyio.sleep(0.01)
+            if fail:
+                raise RuntimeError(n)
+            if self.block:
+                await anyio.sleep_forever()
+            return n
+        finally:
+            self.running[self.host] -= 1
+
+
+# noinspection PyDocstring
+class TestBatch:
+    @pytest.mark.anyio
+    async def test_results(self):
+        running = {}
+        one = FakeOperation("one", running)
+        two = FakeOperation("two", running)
+        async with Batch(limit=4, per_host=2) as batch:
+            for n in range(6):
+                batch.submit(one, n=n)
+            batch.submit(two, n=6, fail=True)
+            results = [result async for result in batch]
+        assert sorted(result.kwargs['n'] for result in results) == \
+            list(range(7))
+        assert running['max one'] == 2
+        failed, = [result for result in results if result.error is not None]
+        with pytest.raises(RuntimeError):
+            failed.result()
+        stats = batch.stats
+        assert (stats['completed'], stats['failed'], stats['cancelled']) == \
+            (7, 1, 0)
+        assert stats['max_time'] >= 0.01
+
+    @pytest.mark.anyio
+    async def test_fairness(self):
+        running = {}
+        one = FakeOperation("one", running)
+        two = FakeOperation("two", running)
+        async with Batch(limit=1) as batch:
+            for n in range(5):
+                batch.submit(one, n=n)
+            for n in range(2):
+                batch.submit(two, n=n)
+            results = [result async for result in batch]
+        assert len(results) == 7
+        # served in turn while both hosts have calls waiting
+        started = running['started']
+        assert max(pos for pos, host in enumerate(started)
+                   if host == "two") <= 4
+
+    @pytest.mark.anyio
+    async def test_fail_fast(self):
+        # the other calls can only end by being cancelled
+        op = FakeOperation("one", {}, block=True)
+        with anyio.fail_after(5):
+            async with Batch(limit=2, fail_fast=True) as batch:
+                batch.submit(op, n=0, fail=True)
+                await op.entered.wait()
+                for n in range(1, 10):
+                    batch.submit(op, n=n)
+                results = [result async for result in batch]
+        failed, = results
+        assert failed.kwargs['n'] == 0
+        assert isinstance(failed.error, RuntimeError)
+        assert batch.stats['cancelled'] == 9
+
+    @pytest.mark.anyio
+    async def test_pool_limit(self):
+        client = SwaggerClient(max_connections=3)
+        try:
+            assert client.batch(limit=10).limit.total == 3
+            assert client.batch(limit=2).limit.total == 2
+        finally:
+            await client.close()
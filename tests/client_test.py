@@ -8,6 +8,10 @@
 """Swagger client tests.
 """
 
+import json
+import os
+import urllib.request
+
 from mocket.plugins.httpretty import httpretty,async_httprettified
 import pytest
 
@@ -15,7 +19,7 @@ import pytest
 CREATED=201
 NO_CONTENT=204
 
-from asyncswagger11.client import SwaggerClient
+from asyncswagger11.client import SwaggerClient, RequestPlan
 
 # noinspection PyDocstring
 class TestClient:
@@ -24,6 +28,18 @@ class TestClient:
         with pytest.raises(AttributeError):
             uut.pet.doesNotExist()
 
+    @pytest.mark.anyio
+    async def test_lazy(self, uut):
+        assert list(uut.resources) == ['pet']
+        assert not uut.resources.built
+        pet = uut.pet
+        assert uut.resources.built == {'pet': pet}
+        assert not pet.operations.built
+        assert len(pet.operations) == 4
+        assert pet.get_operation('listPets') is pet.listPets
+        assert list(pet.operations.built) == ['listPets']
+        assert uut.get_resource('cat') is None
+
     @pytest.mark.anyio
     @async_httprettified
     async def test_bad_param(self, uut):
@@ -75,6 +91,141 @@ class TestClient:
         assert resp.json() == {"id": 1234, "name": "Sparky"}
         assert httpretty.last_request.querystring == {'name': ['Sparky']}
 
+    @pytest.mark.anyio
+    @async_httprettified
+    async def test_trace(self, uut):
+        httpretty.register_uri(
+            httpretty.GET, "http://swagger.py.invalid/swagger-test/pet",
+            content_type="application/json",
+            body='[]')
+        traced = []
+        uut.pet.listPets.trace = lambda *args: traced.append(args)
+
+        await uut.pet.listPets()
+        (nickname, method, uri, elapsed, status), = traced
+        assert (nickname, method, uri, status) == (
+            "listPets", "GET", "http://swagger.py.invalid/swagger-test/pet",
+            200)
+        assert elapsed >= 0
+
+    @pytest.mark.anyio
+    @async_httprettified
+    async def test_shared_model(self, uut):
+        for node in ("one", "two"):
+            httpretty.register_uri(
+                httpretty.GET, "http://%s.py.invalid/swagger-test/pet" % node,
+                content_type="application/json",
+                body='["%s"]' % node)
+
+        for node in ("one", "two"):
+            client = SwaggerClient(
+                model=uut.model,
+                base_url="http://%s.py.invalid/swagger-test" % node)
+            await client.init()
+            try:
+                resp = await client.pet.listPets()
+                assert resp.json() == [node]
+                assert client.pet.listPets.plan is uut.pet.listPets.plan
+            finally:
+                await client.close()
+
+    @pytest.mark.anyio
+    async def test_listing_models(self, uut):
+        listing = json.loads(json.dumps(uut.url))
+        listing['apis'].append({
+            "path": "/api-docs/owner.json",
+            "description": "Uses the other declaration's models",
+            "api_declaration": {
+                "swaggerVersion": "1.1",
+                "basePath": "http://swagger.py.invalid/swagger-test",
+                "resourcePath": "/owner.json",
+                "apis": [{
+                    "path": "/owner/{name}/pets",
+                    "operations": [{
+                        "httpMethod": "GET",
+                        "nickname": "listOwnedPets",
+                        "responseClass": "List[Pet]",
+                        "parameters": [{"name": "name",
+                                        "paramType": "path"}],
+                    }],
+                }],
+                "models": {},
+            },
+        })
+        client = SwaggerClient(url=listing, typed=True)
+        await client.init()
+        try:
+            decode = client.owner.listOwnedPets.decode
+            pet, = decode([{"id": 1, "owner": {"name": "Bob"}}])
+            assert type(pet) is client.pet.models["Pet"]
+            assert pet.owner.name == "Bob"
+        finally:
+            await client.close()
+
+    @pytest.mark.anyio
+    async def test_reload(self, tmp_path):
+        with open('test-data/1.1/simple/simple.json') as fp:
+            decl = json.load(fp)
+        with open('test-data/1.1/simple/resources.json') as fp:
+            listing = json.load(fp)
+        listing['basePath'] = 'file:' + urllib.request.pathname2url(
+            str(tmp_path))
+        (tmp_path / 'resources.json').write_text(json.dumps(listing))
+        (tmp_path / 'simple.json').write_text(json.dumps(decl))
+
+        client = SwaggerClient(
+            'file:' + urllib.request.pathname2url(
+                str(tmp_path / 'resources.json')),
+            base_url="http://swagger.py.invalid/swagger-test")
+        await client.init()
+        try:
+            old = client.simple.getAsteriskInfo
+            http_client = client.http_client
+            assert not await client.reload()
+
+            operation = decl['apis'][0]['operations'][0]
+            decl['apis'][0]['operations'].append(
+                dict(operation, nickname='getAsteriskStatus'))
+            path = str(tmp_path / 'simple.json')
+            (tmp_path / 'simple.json').write_text(json.dumps(decl))
+            st = os.stat(path)
+            os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+            assert await client.changed()
+            assert await client.reload()
+
+            assert client.simple.getAsteriskStatus.plan.nickname == \
+                'getAsteriskStatus'
+            assert client.simple.getAsteriskInfo.plan is not old.plan
+            assert old.plan.nickname == 'getAsteriskInfo'
+            assert client.http_client is http_client
+            assert not await client.reload()
+        finally:
+            await client.close()
+
+    @pytest.mark.anyio
+    @async_httprettified
+    async def test_typed(self, uut):
+        httpretty.register_uri(
+            httpretty.GET, "http://swagger.py.invalid/swagger-test/pet",
+            content_type="application/json",
+            body='[{"id": 1, "name": "Sparky", "owner": {"name": "Bob"}},'
+                 ' {"id": 2, "name": "Rex", "legs": 3}]')
+        httpretty.register_uri(
+            httpretty.DELETE, "http://swagger.py.invalid/swagger-test/pet/1",
+            status=NO_CONTENT)
+
+        client = SwaggerClient(model=uut.model, typed=True)
+        await client.init()
+        try:
+            sparky, rex = await client.pet.listPets()
+            assert type(sparky).__name__ == 'Pet'
+            assert (sparky.id, sparky.name, rex.owner) == (1, "Sparky", None)
+            assert sparky.owner.name == "Bob"
+            assert not hasattr(rex, 'legs')
+            assert await client.pet.deletePet(petId=1) is None
+        finally:
+            await client.close()
+
     @pytest.mark.anyio
     @async_httprettified
     async def test_delete(self, uut):
@@ -86,3 +237,90 @@ class TestClient:
         assert resp.status_code == NO_CONTENT
         assert resp.read() == b''
 
+
+
+# noinspection PyDocstring
+class TestRequestPlan:
+    plan = RequestPlan("http://swagger.py.invalid/pet/{petId}/{mode}", {
+        "httpMethod": "PUT",
+        "nickname": "updatePet",
+        "parameters": [
+            {"name": "petId", "paramType": "path", "required": True},
+            {"name": "mode", "paramType": "path", "required": True},
+            {"name": "tags", "paramType": "query", "allowMultiple": True},
+            {"name": "name", "paramType": "body", "required": False},
+        ]})
+
+    def test_compiled(self):
+        assert self.plan.method == "PUT"
+        assert self.plan.path_params == {"petId", "mode"}
+        assert self.plan.query_params == {"tags"}
+        assert self.plan.body_params == {"name"}
+        assert self.plan.required == {"petId", "mode"}
+
+    def test_bind(self):
+        uri, params, data = self.plan.bind(dict(
+            petId="a b/c", mode="fast", tags=["x", "y"], name=None))
+        assert uri == "http://swagger.py.invalid/pet/a+b%2Fc/fast"
+        assert params == {"tags": "x,y"}
+        assert data is None
+
+        uri, params, data = self.plan.bind(dict(
+            petId=12, mode="x", name="Sparky"))
+        assert uri == "http://swagger.py.invalid/pet/12/x"
+        assert params == {}
+        assert data == {"name": "Sparky"}
+
+    def test_bind_errors(self):
+        with pytest.raises(TypeError):
+            self.plan.bind(dict(petId=1))
+        with pytest.raises(TypeError):
+            self.plan.bind(dict(petId=1, mode="x", color="red"))
+
+    def test_validate(self):
+        plan = RequestPlan("http://swagger.py.invalid/play/{playbackId}", {
+            "httpMethod": "POST",
+            "nickname": "play",
+            "parameters": [
+                {"name": "playbackId", "paramType": "path",
+                 "dataType": "string"},
+                {"name": "skipms", "paramType": "query", "dataType": "int",
+                 "allowableValues": {"valueType": "RANGE", "min": 0}},
+                {"name": "media", "paramType": "query", "dataType": "string",
+                 "allowMultiple": True},
+                {"name": "mute", "paramType": "query", "dataType": "boolean"},
+                {"name": "direction", "paramType": "query",
+                 "dataType": "string", "allowableValues": {
+                     "valueType": "LIST", "values": ["in", "out", "both"]}},
+                {"name": "channels", "paramType": "query",
+                 "dataType": "string", "allowMultiple": True,
+                 "allowableValues": {
+                     "valueType": "LIST", "values": ["in", "out"]}},
+                {"name": "gain", "paramType": "query", "dataType": "double",
+                 "allowableValues": {"valueType": "RANGE", "max": 10}},
+            ]})
+        uri, params, data = plan.bind(dict(
+            playbackId=17, skipms="3000", media=["a", "b"], mute="true",
+            direction="in"))
+        assert uri == "http://swagger.py.invalid/play/17"
+        assert params == dict(skipms=3000, media="a,b", mute=True,
+                              direction="in")
+
+        params = plan.bind(dict(playbackId=1, channels="in,out", gain=3))[1]
+        assert params == dict(channels="in,out", gain=3)
+        assert plan.bind(dict(playbackId=1, gain="2.5"))[1] == dict(gain=2.5)
+        assert plan.bind(dict(playbackId=1, media=("a", 2)))[1] == dict(
+            media="a,2")
+
+        for bad, error in ((dict(skipms="fast"), ValueError),
+                           (dict(skipms=-1), ValueError),
+                           (dict(skipms=[1]), TypeError),
+                           (dict(mute="maybe"), ValueError),
+                           (dict(media=["a", None]), TypeError),
+                           (dict(direction="sideways"), ValueError),
+                           (dict(channels="in,sideways"), ValueError),
+                           (dict(gain=11), ValueError)):
+            with pytest.raises(error, match="for 'play'"):
+                plan.bind(dict(playbackId=1, **bad))
+        assert plan.bind(dict(playbackId=1, direction="sideways"),
+                         validate=False)[1] == dict(direction="sideways")
@@ -0,0 +1,38 @@
+#!/usr/bin/env python
+
+#
+# Copyright (c) 2018, Matthias Urlichs
+#
+
+import pytest
+
+from asyncswagger11 import codec
+from asyncswagger11.http_client import AsynchronousHttpClient
+
+
+def installed_codecs():
+    for cls in codec.CODECS:
+        try:
+            yield cls()
+        except ImportError:
+            pass
+
+
+# noinspection PyDocstring
+class TestCodec:
+    @pytest.mark.parametrize('uut', list(installed_codecs()), ids=repr)
+    def test_roundtrip(self, uut):
+        obj = {"type": "StasisStart", "args": ["ä", 1, 2.5, None, True]}
+        data = uut.dumps(obj)
+        assert isinstance(data, bytes)
+        assert uut.loads(data) == obj
+        assert uut.loads(data.decode('utf-8')) == obj
+        with pytest.raises(ValueError):
+            uut.loads(b'{"type": ')
+
+    def test_select(self):
+        assert codec.get_codec('json').name == 'json'
+        assert codec.default.name == next(installed_codecs()).name
+        with pytest.raises(ValueError):
+            codec.get_codec('yaml')
+        assert AsynchronousHttpClient(codec='json').codec.name == 'json'
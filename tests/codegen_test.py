@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+
+#
+# Copyright (c) 2018, Matthias Urlichs
+#
+
+import importlib
+import json
+import sys
+
+from mocket.plugins.httpretty import httpretty, async_httprettified
+import pytest
+
+from asyncswagger11.codegen import generate, load, main, \
+    render_operation, render_resource
+from asyncswagger11.processors import SwaggerError
+
+
+@pytest.fixture
+def generated(uut, tmp_path):
+    generate(uut.api_docs, str(tmp_path / "pet_client"))
+    sys.path.insert(0, str(tmp_path))
+    try:
+        yield importlib.import_module("pet_client")
+    finally:
+        sys.path.remove(str(tmp_path))
+        for name in list(sys.modules):
+            if name.startswith("pet_client"):
+                del sys.modules[name]
+
+
+# noinspection PyDocstring
+class TestCodegen:
+    @pytest.mark.anyio
+    @async_httprettified
+    async def test_generated(self, generated):
+        httpretty.register_uri(
+            httpretty.GET, "http://swagger.py.invalid/swagger-test/pet/find",
+            content_type="application/json",
+            body='[]')
+        httpretty.register_uri(
+            httpretty.DELETE,
+            "http://swagger.py.invalid/swagger-test/pet/a%2Fb",
+            status=204)
+
+        async with generated.Client() as client:
+            resp = await client.pet.findPets(species=['cat', 'dog'])
+            assert resp.json() == []
+            assert httpretty.last_request.querystring == \
+                {'species': ['cat,dog']}
+            resp = await client.pet.deletePet(petId="a/b")
+            assert resp.status_code == 204
+            with pytest.raises(TypeError):
+                await client.pet.createPet()
+
+    def test_main(self, tmp_path):
+        main(["codegen", "test-data/1.1/simple/resources.json",
+              str(tmp_path / "simple_client")])
+        source = (tmp_path / "simple_client" / "simple.py").read_text()
+        assert "async def getAsteriskInfo(self, *, test_param=None):" \
+            in source
+        compile(source, "simple.py", "exec")
+
+    @pytest.mark.anyio
+    async def test_validate(self, tmp_path):
+        generate(await load("test-data/1.1/simple/resources.json"),
+                 str(tmp_path / "simple_client"))
+        sys.path.insert(0, str(tmp_path))
+        try:
+            simple_client = importlib.import_module("simple_client")
+        finally:
+            sys.path.remove(str(tmp_path))
+        try:
+            async with simple_client.Client() as client:
+                with pytest.raises(ValueError, match="for 'getAsteriskInfo'"):
+                    await client.simple.getAsteriskInfo(test_param="baz")
+        finally:
+            for name in list(sys.modules):
+                if name.startswith("simple_client"):
+                    del sys.modules[name]
+
+    def test_unsupported(self):
+        operation = {"httpMethod": "GET", "nickname": "getToken",
+                     "parameters": [{"name": "X-Token",
+                                     "paramType": "header"}]}
+        with pytest.raises(SwaggerError, match="Unsupported paramType"):
+            render_operation("/token", operation, {})
+        operation = {"httpMethod": "GET", "nickname": "events",
+                     "is_websocket": True,
+                     "parameters": [{"name": "app", "paramType": "body"}]}
+        with pytest.raises(SwaggerError, match="websockets"):
+            render_operation("/events", operation, {})
+
+    @pytest.mark.anyio
+    async def test_reserved_names(self):
+        resource = {"name": "clash", "api_declaration": {
+            "basePath": "http://swagger.py.invalid", "apis": [{
+                "path": "/clash", "operations": [{
+                    "httpMethod": "POST", "nickname": "clash",
+                    "parameters": [
+                        {"name": "params", "paramType": "query"},
+                        {"name": "self", "paramType": "query",
+                         "required": True},
+                        {"name": "headers", "paramType": "body"},
+                    ]}]}]}}
+        namespace = {}
+        exec(compile(render_resource(resource, "test"), "clash.py", "exec"),
+             namespace)
+        sent = []
+
+        class FakeHttpClient:
+            codec = json
+
+            async def request(self, method, url, **kwargs):
+                sent.append(kwargs)
+
+        clash = namespace["Clash"](FakeHttpClient())
+        await clash.clash(self_="me", params="p", headers="h")
+        kwargs, = sent
+        assert kwargs["params"] == {"params": "p", "self": "me"}
+        assert json.loads(kwargs["data"]) == {"headers": "h"}
+        assert kwargs["headers"]["Accept"] == "application/json"
@@ -1,9 +1,52 @@
 #!/usr/bin/env python
 
+import anyio
 import pytest
 from asyncswagger11.client import SwaggerClient
 from asyncswagger11.http_client import AsynchronousHttpClient
 
+
+class FakeWebsocket:
+    """Delivers some messages, then ends, or stays open if idle is set.
+
+    Sent messages are recorded in sent.
+    """
+    def __init__(self, messages, idle=False):
+        self.messages = messages
+        self.idle = idle
+        self.sent = []
+        self.closed = False
+
+    async def __aiter__(self):
+        for message in self.messages:
+            await anyio.sleep(0)
+            yield message
+        if self.idle:
+            await anyio.sleep_forever()
+
+    async def send(self, data):
+        self.sent.append(data)
+
+    async def close(self):
+        self.closed = True
+
+
+class FakeWebsocketClient(AsynchronousHttpClient):
+    """Opens FakeWebsockets.
+
+    connect is called with the number of the connection attempt,
+    starting at 1, and returns the websocket or raises an error.
+    Attempts are recorded in connects.
+    """
+    def __init__(self, connect):
+        super().__init__()
+        self.connect = connect
+        self.connects = []
+
+    async def ws_connect(self, url, params=None, headers=None):
+        self.connects.append((url, params))
+        return self.connect(len(self.connects))
+
 @pytest.fixture
 def httpretty(request):
     """Setup httpretty; create ARI client.
@@ -42,11 +85,13 @@ async def uut():
                             "operations": [
                                 {
                                     "httpMethod": "GET",
-                                    "nickname": "listPets"
+                                    "nickname": "listPets",
+                                    "responseClass": "List[Pet]"
                                 },
                                 {
                                     "httpMethod": "POST",
                                     "nickname": "createPet",
+                                    "responseClass": "Pet",
                                     "parameters": [
                                         {
                                             "name": "name",
@@ -91,7 +136,22 @@ async def uut():
                             ]
                         }
                     ],
-                    "models": {}
+                    "models": {
+                        "Pet": {
+                            "id": "Pet",
+                            "properties": {
+                                "id": {"type": "long"},
+                                "name": {"type": "string"},
+                                "owner": {"type": "Person"}
+                            }
+                        },
+                        "Person": {
+                            "id": "Person",
+                            "properties": {
+                                "name": {"type": "string"}
+                            }
+                        }
+                    }
                 }
             }
         ]
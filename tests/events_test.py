@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+
+#
+# Copyright (c) 2018, Matthias Urlichs
+#
+
+import json
+
+import anyio
+import pytest
+from wsproto.events import TextMessage, Ping
+
+from asyncswagger11.events import EventDispatcher, DROP
+
+from .conftest import FakeWebsocket, FakeWebsocketClient
+
+
+async def fake_websocket(*events):
+    """Async iterable of websocket messages carrying the given events."""
+    yield Ping()
+    for event in events:
+        await anyio.sleep(0)
+        if isinstance(event, str):
+            yield TextMessage(data=event)
+        else:
+            yield TextMessage(data=json.dumps(event))
+
+
+# noinspection PyDocstring
+class TestEventDispatcher:
+    @pytest.mark.anyio
+    async def test_routing(self):
+        seen = []
+        uut = EventDispatcher(max_handlers=1)
+
+        @uut.on('StasisStart')
+        async def start(event):
+            seen.append(('start', event['n']))
+
+        async def other(event):
+            seen.append(('other', event.get('type')))
+        uut.on(None, other)
+
+        async def broken(event):
+            raise RuntimeError("oops")
+        uut.on('StasisEnd', broken)
+
+        await uut.run(fake_websocket(
+            {'type': 'StasisStart', 'n': 1}, 'not json', {'type': 'Dial'},
+            {'type': 'StasisEnd'}, {'type': 'StasisStart', 'n': 2}, {'n': 3}))
+        assert seen == [('start', 1), ('other', 'Dial'), ('start', 2),
+                        ('other', None)]
+
+        uut.off('StasisStart', start)
+        assert uut.lookup({'type': 'StasisStart'}) == (other,)
+
+    @pytest.mark.anyio
+    async def test_slow_handler(self):
+        seen = []
+        release = anyio.Event()
+        uut = EventDispatcher(max_handlers=2, buffer=0)
+
+        @uut.on('slow')
+        async def slow(event):
+            await release.wait()
+            seen.append('slow')
+
+        @uut.on('fast')
+        async def fast(event):
+            seen.append('fast')
+            if len(seen) == 3:
+                release.set()
+
+        await uut.run(fake_websocket(
+            {'type': 'slow'}, {'type': 'fast'}, {'type': 'fast'},
+            {'type': 'fast'}))
+        assert seen == ['fast', 'fast', 'fast', 'slow']
+
+
+# noinspection PyDocstring
+class TestWebsocketMultiplexer:
+    @pytest.mark.anyio
+    async def test_fanout(self):
+        ticks = [TextMessage(data=json.dumps({'type': 'Tick', 'n': n}))
+                 for n in range(5)]
+        client = FakeWebsocketClient(
+            lambda n: FakeWebsocket(ticks, idle=True))
+        uut = client.ws_multiplex("ws://swagger.py.invalid/events",
+                                  {'app': 'test'})
+        assert client.ws_multiplex("ws://swagger.py.invalid/events",
+                                   {'app': 'test'}) is uut
+        assert client.ws_multiplex("ws://swagger.py.invalid/events",
+                                   {'app': 'other'}) is not uut
+
+        every = uut.subscribe()
+        odd = uut.subscribe(filter=lambda event: event['n'] % 2)
+        lossy = uut.subscribe(overflow=DROP, buffer=1)
+        seen = []
+        async with anyio.create_task_group() as tg:
+            await tg.start(uut.run)
+            async for event in every:
+                seen.append(event['n'])
+                if len(seen) == 5:
+                    break
+            assert [event['n'] for event in
+                    (await odd.__anext__(), await odd.__anext__())] == [1, 3]
+            assert (await lossy.__anext__())['n'] == 0
+            assert lossy.dropped == 4
+            tg.cancel_scope.cancel()
+        assert seen == list(range(5))
+        assert len(client.connects) == 1
+        assert not uut.subscribers
+        assert client.ws_multiplex("ws://swagger.py.invalid/events",
+                                   {'app': 'test'}) is not uut
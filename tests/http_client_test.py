@@ -1,15 +1,120 @@
 #!/usr/bin/env python
 import base64
+import gc
+from functools import partial
 
+import anyio
+import httpx
 import pytest
+from asyncwebsockets import create_websocket_server
+from wsproto.events import Ping, Pong, TextMessage
 from mocket.plugins.httpretty import httpretty,async_httprettified
 
 from asyncswagger11.http_client import AsynchronousHttpClient, \
-    ApiKeyAuthenticator, BasicAuthenticator
+    ApiKeyAuthenticator, BasicAuthenticator, RetryPolicy, RetryBudget, \
+    TrackedWebsocket, RateLimit, CircuitBreaker, CircuitOpenError, \
+    ws_send_event
+
+from .conftest import FakeWebsocket, FakeWebsocketClient
+
+
+def flaky_client(*errors, retry=None):
+    """A client whose requests first fail with the given errors."""
+    errors = list(errors)
+    calls = []
+    timeouts = []
+
+    def handler(request):
+        calls.append(request.method)
+        timeouts.append(request.extensions['timeout'])
+        if errors:
+            raise errors.pop(0)("boom", request=request)
+        return httpx.Response(200, text="ok")
+
+    session = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    client = AsynchronousHttpClient(session=session, retry=retry or
+                                    RetryPolicy(backoff=0.001))
+    client.timeouts = timeouts
+    return client, calls
+
+
+# noinspection PyDocstring
+class TestRetry:
+    @pytest.mark.anyio
+    async def test_idempotent(self):
+        client, calls = flaky_client(httpx.ReadError, httpx.RemoteProtocolError)
+        resp = await client.request('GET', "http://swagger.py.invalid/")
+        assert resp.status_code == 200
+        assert calls == ['GET'] * 3
+
+    @pytest.mark.anyio
+    async def test_too_many(self):
+        client, calls = flaky_client(*[httpx.ReadError] * 3)
+        with pytest.raises(httpx.ReadError):
+            await client.request('GET', "http://swagger.py.invalid/")
+        assert len(calls) == 3
+
+    @pytest.mark.anyio
+    async def test_not_idempotent(self):
+        client, calls = flaky_client(httpx.ReadError)
+        with pytest.raises(httpx.ReadError):
+            await client.request('POST', "http://swagger.py.invalid/")
+        assert calls == ['POST']
+
+        client, calls = flaky_client(httpx.ConnectError)
+        resp = await client.request('POST', "http://swagger.py.invalid/")
+        assert resp.status_code == 200
+        assert calls == ['POST'] * 2
+
+        client, calls = flaky_client(httpx.ReadTimeout)
+        with pytest.raises(httpx.ReadTimeout):
+            await client.request('POST', "http://swagger.py.invalid/")
+        assert calls == ['POST']
+
+    @pytest.mark.anyio
+    async def test_deadline(self):
+        client, calls = flaky_client(httpx.ReadTimeout, httpx.ReadTimeout,
+                                     retry=RetryPolicy(backoff=0.001,
+                                                       deadline=2))
+        resp = await client.request('GET', "http://swagger.py.invalid/")
+        assert resp.status_code == 200
+        first, *retries = client.timeouts
+        # httpx defaults to 5 seconds
+        assert first['read'] == 5
+        assert len(retries) == 2
+        assert all(0 < timeout['read'] <= 2 for timeout in retries)
+
+        client, calls = flaky_client(httpx.ReadError,
+                                     retry=RetryPolicy(deadline=0))
+        with pytest.raises(httpx.ReadError):
+            await client.request('GET', "http://swagger.py.invalid/")
+        assert calls == ['GET']
+
+    @pytest.mark.anyio
+    async def test_budget(self):
+        retry = RetryPolicy(backoff=0.001, budget=RetryBudget(reserve=1))
+        client, calls = flaky_client(*[httpx.ReadError] * 3, retry=retry)
+        with pytest.raises(httpx.ReadError):
+            await client.request('GET', "http://swagger.py.invalid/")
+        assert len(calls) == 2
 
 
 # noinspection PyDocstring
 class TestAsynchronousClient:
+    @pytest.mark.anyio
+    async def test_shared_session(self):
+        client = AsynchronousHttpClient(max_connections=7, timeout=5,
+                                        connect_timeout=1)
+        assert client.session.timeout.connect == 1
+        assert client.session.timeout.read == 5
+        other = AsynchronousHttpClient(session=client.session)
+        assert other.session is client.session
+
+        await other.close()
+        assert not client.session.is_closed
+        await client.close()
+        assert client.session.is_closed
+
     @pytest.mark.anyio
     @async_httprettified
     async def test_simple_get(self, client):
@@ -88,3 +193,234 @@ class TestAsynchronousClient:
     test_auth_leak.auth = BasicAuthenticator(host="swagger.py.invalid",
             username="unit", password='peekaboo')
 
+
+
+def flaky_websocket(n):
+    """Connections alternately fail, and deliver a few messages."""
+    if n % 2:
+        raise ConnectionRefusedError()
+    return FakeWebsocket([TextMessage(data="%d.%d" % (n, i))
+                          for i in range(3)])
+
+
+# noinspection PyDocstring
+class TestSupervisedWebsocket:
+    @pytest.mark.anyio
+    async def test_reconnect(self):
+        client = FakeWebsocketClient(flaky_websocket)
+        uut = client.ws_supervise("ws://swagger.py.invalid/events",
+                                  {'app': 'test'})
+        uut.backoff = 0.001
+        uut.queue_size = 2
+        seen = []
+        async with uut:
+            async for message in uut:
+                seen.append(message.data)
+                if len(seen) == 9:
+                    break
+            stats = uut.stats
+        assert seen == ["2.0", "2.1", "2.2", "4.0", "4.1", "4.2",
+                        "6.0", "6.1", "6.2"]
+        assert client.connects[0] == \
+            ("ws://swagger.py.invalid/events", {'app': 'test'})
+        assert stats['reconnects'] >= 2
+        assert stats['downtime'] > 0
+
+    @pytest.mark.anyio
+    async def test_heartbeat(self):
+        """Pings go both ways over a real asyncwebsockets connection."""
+        seen = []
+
+        async def serve(sock):
+            async with sock:
+                ws = await create_websocket_server(sock)
+                await ws_send_event(ws, Ping(b'srv'))
+                async for event in ws:
+                    seen.append(type(event).__name__)
+                    if isinstance(event, Ping):
+                        await ws_send_event(ws, event.response())
+                        await ws.send("done")
+
+        async with await anyio.create_tcp_listener(
+                local_host='127.0.0.1') as listener, \
+                anyio.create_task_group() as tg:
+            tg.start_soon(listener.serve, serve)
+            port = listener.extra(anyio.abc.SocketAttribute.local_port)
+            client = AsynchronousHttpClient()
+            uut = client.ws_supervise("ws://127.0.0.1:%d/events" % port)
+            uut.ping_interval = 0.05
+            uut.ping_timeout = 5
+            with anyio.fail_after(5):
+                async with uut:
+                    message = await uut.receive()
+                    stats = uut.stats
+            await client.close()
+            tg.cancel_scope.cancel()
+        assert message.data == "done"
+        assert seen == ['Pong', 'Ping']
+        assert stats['reconnects'] == 0
+        assert stats['downtime'] == 0
+
+
+# noinspection PyDocstring
+class TestTrackedWebsocket:
+    @pytest.mark.anyio
+    async def test_lifecycle(self):
+        client = AsynchronousHttpClient()
+        done = TrackedWebsocket(client.websockets, FakeWebsocket(
+            [TextMessage(data="x")]))
+        closed = TrackedWebsocket(client.websockets, FakeWebsocket([]))
+        left = TrackedWebsocket(client.websockets, FakeWebsocket(
+            [TextMessage(data="y")], idle=True))
+        lingering = [TrackedWebsocket(client.websockets, FakeWebsocket([]))
+                     for _ in range(3)]
+        abandoned = FakeWebsocket([])
+        TrackedWebsocket(client.websockets, abandoned)
+        gc.collect()
+        assert len(client.websockets) == 7
+
+        assert [message.data async for message in done] == ["x"]
+        async with closed:
+            pass
+        assert closed._websocket.closed
+        # what "async for ...: break" does once the loop is finalized
+        messages = left.__aiter__()
+        assert (await messages.__anext__()).data == "y"
+        await messages.aclose()
+        assert len(client.websockets) == 5
+
+        await client.close()
+        assert not client.websockets
+        assert all(ws._websocket.closed for ws in lingering + [left])
+        assert abandoned.closed
+
+
+# noinspection PyDocstring
+class TestRateLimit:
+    @pytest.mark.anyio
+    async def test_token_bucket(self):
+        uut = RateLimit(rate=100, burst=2)
+        started = anyio.current_time()
+        for _ in range(5):
+            async with uut:
+                pass
+        # two from the burst, three more at 10ms each
+        assert anyio.current_time() - started >= 0.025
+
+    @pytest.mark.anyio
+    async def test_request(self):
+        running = []
+        peak = []
+
+        async def handler(request):
+            running.append(request)
+            peak.append(len(running))
+            await anyio.sleep(0.01)
+            running.remove(request)
+            return httpx.Response(200, text="ok")
+
+        session = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        client = AsynchronousHttpClient(
+            session=session, host_limit=dict(concurrency=3),
+            operation_limits={'originate': dict(concurrency=1)})
+        urls = ["http://one.invalid/ari/channels",
+                "http://two.invalid/ari/channels"]
+        async with anyio.create_task_group() as tg:
+            for _ in range(5):
+                for url in urls:
+                    tg.start_soon(client.request, 'GET', url)
+        assert max(peak) == 6
+        peak.clear()
+        async with anyio.create_task_group() as tg:
+            for _ in range(3):
+                tg.start_soon(partial(client.request, 'POST', urls[0],
+                                      operation='originate'))
+        assert max(peak) == 1
+        assert len(client.limits_for(urls[0], 'originate')) == 2
+        assert client.limits_for(urls[0], 'hangup') == \
+            client.limits_for(urls[0])
+
+
+# noinspection PyDocstring
+class TestCircuitBreaker:
+    @pytest.mark.anyio
+    async def test_states(self):
+        uut = CircuitBreaker("ari.invalid", failure_threshold=2,
+                             recovery_time=0.01, probes=1)
+        for _ in range(2):
+            uut.before()
+            uut.failure()
+        assert uut.state == uut.OPEN
+        with pytest.raises(CircuitOpenError):
+            uut.before()
+
+        await anyio.sleep(0.01)
+        assert uut.before() is True
+        assert uut.state == uut.HALF_OPEN
+        with pytest.raises(CircuitOpenError):
+            uut.before()
+        uut.failure(True)
+        assert uut.state == uut.OPEN
+
+        await anyio.sleep(0.01)
+        probe = uut.before()
+        uut.success(probe)
+        assert uut.stats == dict(state=uut.CLOSED, failures=0, trips=2,
+                                 refused=2, in_flight=0)
+
+    @pytest.mark.anyio
+    async def test_late_verdicts(self):
+        uut = CircuitBreaker("ari.invalid", failure_threshold=1,
+                             recovery_time=0.01, probes=1)
+        slow_ok, slow_failed = uut.before(), uut.before()
+        assert (slow_ok, slow_failed) == (False, False)
+        uut.failure(uut.before())
+        assert uut.state == uut.OPEN
+        opened = uut.opened
+
+        # requests sent before the circuit opened don't extend the wait
+        uut.failure(slow_failed)
+        assert (uut.state, uut.opened, uut.trips) == (uut.OPEN, opened, 1)
+
+        await anyio.sleep(0.01)
+        probe = uut.before()
+        # nor can they close the circuit in place of the probe
+        uut.success(slow_ok)
+        assert (uut.state, uut.probing) == (uut.HALF_OPEN, 1)
+        uut.success(probe)
+        assert uut.state == uut.CLOSED
+        assert uut.in_flight == 0
+
+    @pytest.mark.anyio
+    async def test_probe_after_limits(self):
+        client, calls = flaky_client(retry=RetryPolicy(retries=0))
+        client.circuit_breaker = dict(failure_threshold=1, recovery_time=0)
+        client.host_limit = dict(concurrency=1)
+        circuit = client.circuit_for("http://ari.invalid/")
+        circuit.open()
+        limit, = client.limits_for("http://ari.invalid/")
+        with anyio.fail_after(5):
+            async with anyio.create_task_group() as tg:
+                await limit.__aenter__()
+                for _ in range(3):
+                    tg.start_soon(client.request, 'GET',
+                                  "http://ari.invalid/ari/info")
+                await anyio.sleep(0.01)
+                # queued for the rate limit, not holding the probe slot
+                assert circuit.probing == 0
+                await limit.__aexit__(None, None, None)
+        assert len(calls) == 3
+        assert circuit.state == circuit.CLOSED
+
+    @pytest.mark.anyio
+    async def test_request(self):
+        client, calls = flaky_client(*[httpx.ConnectError] * 3,
+                                     retry=RetryPolicy(retries=0))
+        client.circuit_breaker = dict(failure_threshold=2, recovery_time=60)
+        for _ in range(2):
+            with pytest.raises(httpx.ConnectError):
+                await client.request('GET', "http://ari.invalid/ari/info")
+        with pytest.raises(CircuitOpenError):
+            await client.request('GET', "http://ari.invalid/ari/info")
+        assert len(calls) == 2
+        assert client.circuits["ari.invalid"].state == CircuitBreaker.OPEN
@@ -5,10 +5,19 @@
 # Copyright (c) 2018, Matthias Urlichs
 #
 
+import os
+import shutil
+import threading
+import time
+
+import anyio
 import pytest
+from mocket.plugins.httpretty import httpretty, async_httprettified
 import asyncswagger11
 
 from asyncswagger11 import swagger_model
+from asyncswagger11.cache import MemorySpecCache, FileSpecCache
+from asyncswagger11.http_client import AsynchronousHttpClient
 
 
 class FakeProcessor(swagger_model.SwaggerProcessor):
@@ -16,6 +25,48 @@ class FakeProcessor(swagger_model.SwaggerProcessor):
         resources['processed'] = True
 
 
+class WalkingProcessor(swagger_model.SwaggerProcessor):
+    def apply(self, resources):
+        pass
+
+
+class CountingProcessor(swagger_model.SwaggerProcessor):
+    count = 0
+
+    def process_resource_listing(self, resources, context):
+        self.count += 1
+
+
+class RecordingProcessor(swagger_model.SwaggerProcessor):
+    def __init__(self, tag, log):
+        self.tag = tag
+        self.log = log
+
+    def process_resource_listing(self, resources, context):
+        self.log.append((self.tag, 'listing'))
+
+    def process_operation(self, resources, resource, api, operation, context):
+        self.log.append((self.tag, operation['nickname']))
+
+
+class SlowLoader(swagger_model.Loader):
+    """Loader that fakes API declarations, finishing in reverse order."""
+    running = 0
+    max_running = 0
+
+    async def load_api_declaration(self, base_url, api_dict, validators=None,
+                                   fetched=None):
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        try:
+            await anyio.sleep(0.01 * (10 - api_dict['n']))
+            if api_dict.get('fail'):
+                raise IOError(api_dict['n'])
+            api_dict['api_declaration'] = api_dict['n']
+        finally:
+            self.running -= 1
+
+
 class TestLoader:
     @pytest.mark.anyio
     async def test_simple(self):
@@ -41,6 +92,174 @@ class TestLoader:
         except IOError:
             pass
 
+    @pytest.mark.anyio
+    async def test_concurrent(self):
+        apis = [{'n': n} for n in range(6)]
+        loader = SlowLoader(None, max_concurrency=3)
+        await loader.load_api_declarations('file:///', apis)
+        assert [api['api_declaration'] for api in apis] == list(range(6))
+        assert loader.max_running == 3
+
+    @pytest.mark.anyio
+    async def test_file_thread(self, monkeypatch):
+        reads = []
+        read_file_url = swagger_model.read_file_url
+
+        def slow_read(*args):
+            reads.append(threading.current_thread())
+            time.sleep(0.05)
+            return read_file_url(*args)
+        monkeypatch.setattr(swagger_model, 'read_file_url', slow_read)
+
+        ticks = 0
+        async with anyio.create_task_group() as tg:
+            async def ticker():
+                nonlocal ticks
+                while True:
+                    ticks += 1
+                    await anyio.sleep(0.005)
+            tg.start_soon(ticker)
+            await asyncswagger11.load_file(
+                'test-data/1.1/simple/resources.json')
+            tg.cancel_scope.cancel()
+        assert len(reads) == 2
+        assert threading.main_thread() not in reads
+        assert ticks > 5
+
+    @pytest.mark.anyio
+    async def test_concurrent_error(self):
+        apis = [{'n': n, 'fail': n in (2, 5)} for n in range(6)]
+        loader = SlowLoader(None)
+        with pytest.raises(IOError) as err:
+            await loader.load_api_declarations('file:///', apis)
+        assert err.value.args == (2,)
+
+    @pytest.mark.anyio
+    async def test_cache(self, tmp_path, monkeypatch):
+        reads = []
+        read_file_url = swagger_model.read_file_url
+
+        def counting_read(url, *args):
+            res = read_file_url(url, *args)
+            if res is not None:
+                reads.append(url.rsplit('/', 1)[1])
+            return res
+        monkeypatch.setattr(swagger_model, 'read_file_url', counting_read)
+
+        shutil.copytree('test-data/1.1/simple', tmp_path / 'simple')
+        listing = str(tmp_path / 'simple' / 'resources.json')
+        cache = MemorySpecCache()
+        proc = CountingProcessor()
+
+        uut = await asyncswagger11.load_file(listing, processors=[proc],
+                                             cache=cache)
+        assert proc.count == 1
+        again = await asyncswagger11.load_file(listing, processors=[proc],
+                                               cache=cache)
+        assert proc.count == 1
+        assert again is uut
+
+        decl = str(tmp_path / 'simple' / 'simple.json')
+        st = os.stat(decl)
+        os.utime(decl, ns=(st.st_atime_ns, st.st_mtime_ns + 1000000000))
+        del reads[:]
+        again = await asyncswagger11.load_file(listing, processors=[proc],
+                                               cache=cache)
+        assert proc.count == 2
+        assert again is not uut
+        # the changed declaration is read once, by revalidation
+        assert sorted(reads) == ['resources.json', 'simple.json']
+
+    @pytest.mark.anyio
+    async def test_file_cache(self, tmp_path):
+        threads = []
+
+        class ThreadCache(FileSpecCache):
+            def get(self, url):
+                threads.append(threading.get_ident())
+                return super().get(url)
+
+            def put(self, url, entry):
+                threads.append(threading.get_ident())
+                super().put(url, entry)
+
+        cache = ThreadCache(str(tmp_path / 'cache'))
+        uut = await asyncswagger11.load_file(
+            'test-data/1.1/simple/resources.json', cache=cache)
+        # file I/O stays off the event loop
+        assert len(threads) == 2
+        assert threading.get_ident() not in threads
+        assert cache.get(uut['url'])['listing'] == uut
+
+        proc = CountingProcessor()
+        again = await asyncswagger11.load_file(
+            'test-data/1.1/simple/resources.json', cache=cache,
+            processors=[proc])
+        # different processors: not served from the cache
+        assert proc.count == 1
+        assert again == uut
+
+    @pytest.mark.anyio
+    @async_httprettified
+    async def test_cache_http(self):
+        with open('test-data/1.1/simple/resources.json') as fp:
+            listing = fp.read().replace(
+                'http://localhost', 'http://swagger.py.invalid')
+        with open('test-data/1.1/simple/simple.json') as fp:
+            decl = fp.read()
+        for path, body in (('resources.json', listing), ('simple.json', decl)):
+            httpretty.register_uri(
+                httpretty.GET, "http://swagger.py.invalid/swagger/test/" + path,
+                responses=[
+                    httpretty.Response(body=body, headers={
+                        'ETag': '"v1"',
+                        'Content-Type': 'application/json'}),
+                    httpretty.Response(body='', status=304),
+                ])
+        url = "http://swagger.py.invalid/swagger/test/resources.json"
+        proc = CountingProcessor()
+        client = AsynchronousHttpClient()
+        # mocket can't handle concurrent connects
+        loader = swagger_model.Loader(client, [proc], max_concurrency=1,
+                                      cache=MemorySpecCache())
+        try:
+            uut = await loader.load_resource_listing(url)
+            assert uut['validators'][url] == {'etag': '"v1"'}
+            again = await loader.load_resource_listing(url)
+        finally:
+            await client.close()
+        assert again is uut
+        assert proc.count == 1
+        assert httpretty.last_request.headers['if-none-match'] == '"v1"'
+
+    @pytest.mark.anyio
+    async def test_fused(self):
+        calls = []
+        procs = [RecordingProcessor(n, calls) for n in (1, 2)]
+        fused = await asyncswagger11.load_file(
+            'test-data/1.1/simple/resources.json', processors=procs)
+        assert calls == [(1, 'listing'), (2, 'listing'),
+                         (1, 'getAsteriskInfo'), (2, 'getAsteriskInfo')]
+
+        loader = swagger_model.Loader(None, list(procs), fused=False)
+        assert loader.pipeline == loader.processors
+        del calls[:]
+        plain = await loader.load_resource_listing(
+            fused['url'], base_url=fused['url'].rsplit('/', 1)[0])
+        assert calls == [(1, 'listing'), (1, 'getAsteriskInfo'),
+                         (2, 'listing'), (2, 'getAsteriskInfo')]
+        assert plain == fused
+
+    def test_fuse_pipeline(self):
+        custom = WalkingProcessor()
+        first, second, third = swagger_model.Loader(
+            None, [FakeProcessor(), custom, FakeProcessor()]).pipeline
+        assert len(first.hooks['process_resource_listing']) == 2
+        assert len(first.hooks['process_operation']) == 1
+        assert second is custom
+        assert len(third.hooks['process_resource_listing']) == 1
+        assert len(third.hooks['process_operation']) == 0
+
 
 if __name__ == '__main__':
     unittest.main()
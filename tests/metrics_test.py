@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+
+#
+# Copyright (c) 2018, Matthias Urlichs
+#
+
+import anyio
+import httpx
+import pytest
+
+from asyncswagger11.http_client import AsynchronousHttpClient, \
+    RetryPolicy, TrackedWebsocket
+from asyncswagger11.metrics import Histogram, Metrics
+
+from .conftest import FakeWebsocket
+
+
+# noinspection PyDocstring
+class TestMetrics:
+    def test_histogram(self):
+        uut = Histogram((0.1, 1.0))
+        for value in (0.05, 0.1, 0.5, 3.0):
+            uut.observe(value)
+        assert uut.counts == [2, 1, 1]
+        assert uut.count == 4
+        assert uut.cumulative()[-1] == (float('inf'), 4)
+        assert uut.snapshot()['buckets'][:2] == [(0.1, 2), (1.0, 3)]
+
+    @pytest.mark.anyio
+    async def test_requests(self):
+        async def handler(request):
+            # what httpcore reports once it has a connection
+            await request.extensions['trace'](
+                'http11.send_request_headers.started', {})
+            if request.url.path == '/missing':
+                return httpx.Response(404)
+            return httpx.Response(200, text="ok")
+
+        metrics = Metrics(buckets=(0.5, 5.0))
+        session = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        client = AsynchronousHttpClient(session=session, metrics=metrics,
+                                        retry=RetryPolicy(retries=0))
+        for _ in range(3):
+            await client.request('GET', "http://swagger.py.invalid/pets",
+                                 operation='listPets')
+        with pytest.raises(httpx.HTTPStatusError):
+            await client.request('GET', "http://swagger.py.invalid/missing",
+                                 operation='getPet')
+        await client.request('GET', "http://swagger.py.invalid/api-docs")
+
+        snapshot = metrics.snapshot()
+        assert snapshot['statuses'] == {
+            'listPets': {200: 3}, 'getPet': {404: 1}, None: {200: 1}}
+        assert snapshot['latency']['listPets']['count'] == 3
+        assert snapshot['in_flight'] == {'listPets': 0, 'getPet': 0,
+                                         None: 0}
+        assert snapshot['pool_wait']['count'] == 5
+
+        text = metrics.prometheus()
+        assert 'asyncswagger11_requests_total' \
+            '{operation="getPet",status="404"} 1\n' in text
+        assert 'asyncswagger11_request_duration_seconds_bucket' \
+            '{operation="listPets",le="+Inf"} 3\n' in text
+        assert 'asyncswagger11_requests_in_flight{operation=""} 0\n' in text
+        await client.close()
+
+    @pytest.mark.anyio
+    async def test_websocket(self):
+        metrics = Metrics()
+        client = AsynchronousHttpClient(metrics=metrics)
+        uut = TrackedWebsocket(client.websockets, FakeWebsocket(["a", "b"]),
+                               metrics, "/ari/events")
+        assert [message async for message in uut] == ["a", "b"]
+        await uut.send("c")
+        assert metrics.snapshot()['websockets'] == {
+            '/ari/events': {'received': 2, 'sent': 1}}
+        assert 'asyncswagger11_websocket_messages_total' \
+            '{path="/ari/events",direction="received"} 2\n' \
+            in metrics.prometheus()
+        await client.close()
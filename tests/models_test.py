@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+
+#
+# Copyright (c) 2018, Matthias Urlichs
+#
+
+import pytest
+
+from asyncswagger11.models import ModelRegistry
+
+MODELS = {
+    "Message": {
+        "id": "Message",
+        "discriminator": "type",
+        "subTypes": ["Event"],
+        "properties": {
+            "type": {"type": "string", "required": True},
+        },
+    },
+    "Event": {
+        "id": "Event",
+        "subTypes": ["StasisStart"],
+        "properties": {
+            "application": {"type": "string", "required": True},
+        },
+    },
+    "StasisStart": {
+        "id": "StasisStart",
+        "properties": {
+            "args": {"type": "List[string]"},
+            "channel": {"type": "Channel"},
+            "replace_channel": {"type": "Channel"},
+        },
+    },
+    "Channel": {
+        "id": "Channel",
+        "properties": {
+            "id": {"type": "string"},
+            "caller": {"type": "CallerID"},
+            "peers": {"type": "array", "items": {"$ref": "CallerID"}},
+        },
+    },
+    "CallerID": {
+        "id": "CallerID",
+        "properties": {
+            "name": {"type": "string"},
+            "number": {"type": "string"},
+        },
+    },
+}
+
+EVENT = {
+    "type": "StasisStart",
+    "application": "hello",
+    "args": ["a", "b"],
+    "channel": {
+        "id": "1521034525.42",
+        "caller": {"name": "Alice", "number": "100"},
+        "peers": [{"name": "Bob"}],
+    },
+}
+
+
+# noinspection PyDocstring
+class TestModels:
+    def test_decode(self):
+        registry = ModelRegistry(MODELS)
+        event = registry.decoder("Message")(EVENT)
+        assert type(event) is registry["StasisStart"]
+        assert isinstance(event, registry["Message"])
+        assert not hasattr(event, '__dict__')
+        assert (event.type, event.application, event.args) == (
+            "StasisStart", "hello", ["a", "b"])
+
+        # nested models are converted when first read
+        assert event._pending == {"channel"}
+        channel = event.channel
+        assert event._pending == set()
+        assert event.channel is channel
+        assert event.replace_channel is None
+        assert channel.caller == registry["CallerID"](
+            name="Alice", number="100")
+        assert [peer.name for peer in channel.peers] == ["Bob"]
+        assert event.to_dict() == EVENT
+
+    def test_build(self):
+        registry = ModelRegistry(MODELS)
+        assert registry.decoder("void")({"x": 1}) == {"x": 1}
+        assert registry.decoder("List[CallerID]")([{"name": "x"}]) == [
+            registry["CallerID"](name="x")]
+        assert registry.classes.keys() == {"CallerID"}
+        with pytest.raises(TypeError):
+            registry["CallerID"](nmae="x")
+
+    def test_attribute_names(self):
+        registry = ModelRegistry({"Dial": {"id": "Dial", "properties": {
+            "from": {"type": "string"},
+            "dial-string": {"type": "string"},
+        }}})
+        dial = registry.decoder("Dial")({"from": "a", "dial-string": "b"})
+        assert (dial.from_, dial.dial_string) == ("a", "b")
+        assert dial.to_dict() == {"from": "a", "dial-string": "b"}
+
+    def test_reserved_names(self):
+        registry = ModelRegistry({"Odd": {"id": "Odd", "properties": {
+            "decode": {"type": "string"},
+            "to_dict": {"type": "string"},
+            "_pending": {"type": "CallerID"},
+            "to-dict": {"type": "string"},
+        }}, "CallerID": MODELS["CallerID"]})
+        data = {"decode": "a", "to_dict": "b", "_pending": {"name": "x"},
+                "to-dict": "c"}
+        odd = registry.decoder("Odd")(data)
+        assert (odd.decode_, odd.to_dict_, odd.to_dict__) == ("a", "b", "c")
+        assert odd._pending_.name == "x"
+        assert odd.to_dict() == data
+        assert registry["Odd"].decode(data) == odd
@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+
+#
+# Copyright (c) 2018, Matthias Urlichs
+#
+
+import json
+import os
+import shutil
+
+import pytest
+
+import asyncswagger11
+from asyncswagger11.client import SwaggerClient, client_processors
+from asyncswagger11.snapshot import SnapshotError, load_snapshot, \
+    save_snapshot, spec_hash
+
+
+# noinspection PyDocstring
+class TestSnapshot:
+    @pytest.mark.anyio
+    async def test_roundtrip(self, tmp_path):
+        listing = await asyncswagger11.load_file(
+            'test-data/1.1/simple/resources.json',
+            processors=client_processors())
+        path = str(tmp_path / "simple.swagger-snapshot")
+        digest = save_snapshot(path, listing)
+        assert digest == spec_hash(listing)
+
+        assert load_snapshot(path) == listing
+        assert load_snapshot(path, digest.hex(), use_mmap=False) == listing
+        with pytest.raises(SnapshotError, match="different API"):
+            load_snapshot(path, b"\0" * 32)
+
+        client = SwaggerClient(path, base_url="http://ari.invalid/test")
+        await client.init()
+        try:
+            assert client.simple.getAsteriskInfo.uri == \
+                "http://ari.invalid/test/test"
+            assert client.api_docs['validators']
+        finally:
+            await client.close()
+
+    @pytest.mark.anyio
+    async def test_hash_location(self, tmp_path):
+        shutil.copytree('test-data/1.1/simple', str(tmp_path / "simple"))
+        here, there = [
+            await asyncswagger11.load_file(
+                path, processors=client_processors())
+            for path in ('test-data/1.1/simple/resources.json',
+                         str(tmp_path / "simple" / "resources.json"))]
+        assert here['apis'][0]['url'] != there['apis'][0]['url']
+        assert spec_hash(here) == spec_hash(there)
+
+    @pytest.mark.anyio
+    async def test_hash_base_path(self):
+        listing = await asyncswagger11.load_file(
+            'test-data/1.1/simple/resources.json',
+            processors=client_processors())
+        node = json.loads(json.dumps(listing).replace(
+            "http://localhost/", "http://node2.invalid:8088/"))
+        assert node['apis'][0]['api_declaration']['basePath'] == \
+            "http://node2.invalid:8088/swagger/test"
+        assert spec_hash(node) == spec_hash(listing)
+        node['apis'][0]['api_declaration']['resourcePath'] = "/other"
+        assert spec_hash(node) != spec_hash(listing)
+
+    @pytest.mark.anyio
+    async def test_remote(self):
+        client = SwaggerClient("http://ari.invalid/ari.swagger-snapshot")
+        try:
+            with pytest.raises(ValueError, match="read from files"):
+                await client.init()
+        finally:
+            await client.close()
+
+    @pytest.mark.anyio
+    async def test_reload_failure(self, tmp_path):
+        listing = await asyncswagger11.load_file(
+            'test-data/1.1/simple/resources.json',
+            processors=client_processors())
+        path = str(tmp_path / "simple.swagger-snapshot")
+        digest = save_snapshot(path, listing)
+
+        def replace(api_docs):
+            mtime = os.stat(path).st_mtime_ns
+            save_snapshot(path, api_docs)
+            os.utime(path, ns=(mtime, mtime + 10 ** 9))
+
+        client = SwaggerClient(path, snapshot_hash=digest)
+        await client.init()
+        try:
+            replace(dict(listing, apis=[]))
+            for _ in range(2):
+                assert await client.changed()
+                with pytest.raises(SnapshotError, match="different API"):
+                    await client.reload()
+            replace(listing)
+            assert await client.reload()
+            assert not await client.changed()
+        finally:
+            await client.close()
+
+    def test_damaged(self, tmp_path):
+        path = str(tmp_path / "broken.swagger-snapshot")
+        save_snapshot(path, {"apis": []})
+        with open(path, "r+b") as fp:
+            fp.seek(-1, 2)
+            fp.write(b"\xff")
+        with pytest.raises(SnapshotError, match="damaged"):
+            load_snapshot(path)
+        with open(path, "wb"):
+            pass
+        with pytest.raises(SnapshotError, match="not a snapshot"):
+            load_snapshot(path)